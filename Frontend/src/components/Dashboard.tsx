@@ -1,20 +1,44 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Link } from 'react-router-dom';
 import { FileText, Plus, Calendar, Building, TrendingUp, Star, Eye } from 'lucide-react';
 import { api } from '../utils/api';
 import { Resume } from '../types/types';
 import { useRequireAuth } from '../utils/auth';
 
+// Stop polling for background ATS scores after this long; a score that takes
+// longer has failed (the server marks it so when the worker is restarted).
+const SCORE_POLL_INTERVAL_MS = 3000;
+const SCORE_POLL_LIMIT_MS = 5 * 60 * 1000;
+// Previews that aren't cached yet are rendered in the background; ask again a few times.
+const THUMBNAIL_RETRY_MS = 2000;
+const THUMBNAIL_MAX_RETRIES = 10;
+
 const Dashboard: React.FC = () => {
   useRequireAuth(); // Ensure user is authenticated
   const [resumes, setResumes] = useState<Resume[]>([]);
   const [loading, setLoading] = useState(true);
+  const [thumbnails, setThumbnails] = useState<Record<string, string>>({});
+  const [cursor, setCursor] = useState(0);
+
+  const loadThumbnails = async (ids: string[], attempt: number) => {
+    try {
+      const { thumbnails: ready, pending } = await api.getThumbnails(ids);
+      setThumbnails(prev => ({ ...prev, ...ready }));
+      if (pending.length > 0 && attempt < THUMBNAIL_MAX_RETRIES) {
+        setTimeout(() => loadThumbnails(pending, attempt + 1), THUMBNAIL_RETRY_MS);
+      }
+    } catch (error) {
+      console.error('Failed to fetch thumbnails:', error);
+    }
+  };
 
   useEffect(() => {
     const fetchResumes = async () => {
       try {
-        const data = await api.getResumes();
+        const { results: data, cursor } = await api.getResumesWithCursor();
         setResumes(data);
+        setCursor(cursor);
+        loadThumbnails(data.map((r: Resume) => String(r.id)), 0);
       } catch (error) {
         console.error('Failed to fetch resumes:', error);
       } finally {
@@ -25,6 +49,39 @@ const Dashboard: React.FC = () => {
     fetchResumes();
   }, []);
 
+  // ATS scores are computed in the background after generation; poll the
+  // change feed while any of them is still pending.
+  const hasPending = resumes.some(r => r.scoreStatus === 'pending');
+  const pollStartedAt = useRef<number | null>(null);
+  const [pollExpired, setPollExpired] = useState(false);
+  useEffect(() => {
+    if (!hasPending) {
+      pollStartedAt.current = null;
+      return;
+    }
+    if (pollExpired) return;
+    if (pollStartedAt.current === null) pollStartedAt.current = Date.now();
+    const timer = setInterval(async () => {
+      if (Date.now() - (pollStartedAt.current ?? 0) > SCORE_POLL_LIMIT_MS) {
+        setPollExpired(true);
+        return;
+      }
+      try {
+        const feed = await api.getResultChanges(cursor);
+        if (feed.changes.length > 0) {
+          setResumes(prev => prev.map(r => {
+            const change = feed.changes.find(c => String(c.id) === String(r.id));
+            return change ? { ...r, ...change, id: r.id } : r;
+          }));
+        }
+        setCursor(feed.cursor);
+      } catch (error) {
+        console.error('Failed to fetch resume changes:', error);
+      }
+    }, SCORE_POLL_INTERVAL_MS);
+    return () => clearInterval(timer);
+  }, [hasPending, cursor, pollExpired]);
+
   const formatDate = (dateString: string) => {
     return new Date(dateString).toLocaleDateString('en-US', {
       year: 'numeric',
@@ -137,9 +194,17 @@ const Dashboard: React.FC = () => {
                 <div key={resume.id} className="p-6 hover:bg-white/5 transition-all duration-200 group">
                   <div className="flex items-center justify-between">
                     <div className="flex items-center space-x-4 flex-1">
-                      <div className="bg-gradient-to-r from-blue-600 to-cyan-600 p-3 rounded-lg">
-                        <FileText className="h-6 w-6 text-white" />
-                      </div>
+                      {thumbnails[resume.id] ? (
+                        <img
+                          src={thumbnails[resume.id]}
+                          alt={`${resume.role} preview`}
+                          className="h-20 w-auto rounded border border-white/20 bg-white"
+                        />
+                      ) : (
+                        <div className="bg-gradient-to-r from-blue-600 to-cyan-600 p-3 rounded-lg">
+                          <FileText className="h-6 w-6 text-white" />
+                        </div>
+                      )}
                       <div className="flex-1">
                         <h3 className="text-lg font-semibold text-white">{resume.role}</h3>
                         <div className="flex items-center space-x-4 text-sm text-white/70">
@@ -156,6 +221,11 @@ const Dashboard: React.FC = () => {
                     </div>
                     
                     <div className="flex items-center space-x-4">
+                      {resume.scoreStatus === 'pending' && (
+                        <div className="px-3 py-1 rounded-full border border-white/20 text-sm font-medium text-white/70">
+                          {pollExpired ? 'Score unavailable' : 'Scoring…'}
+                        </div>
+                      )}
                       {resume.atsScore && (
                         <div className={`px-3 py-1 rounded-full border text-sm font-medium ${getScoreBgColor(resume.atsScore)}`}>
                           <span className={getScoreColor(resume.atsScore)}>
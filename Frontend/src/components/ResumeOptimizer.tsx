@@ -139,7 +139,8 @@ const res = await fetch('http://localhost:8000/profiles', {
     const payload = {
       job_description: formData.jobDescription,
       resume: existingResumes.find(r => r.id === formData.selectedResumeId)?.content || formData.currentResume,
-      profile_id: selectedProfileId
+      profile_id: selectedProfileId,
+      result_id: state.resumeId
     };
     try {
       const response = await api.optimizeResume(payload);
@@ -5,6 +5,8 @@ export interface Resume {
   date: string;
   status: 'generated' | 'optimized';
   atsScore?: number;
+  originalScore?: number;
+  scoreStatus?: 'pending' | 'done' | 'failed';
   content?: string;
   jobDescription?: string;
   originalResume?: string;
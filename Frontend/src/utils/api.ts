@@ -1,3 +1,4 @@
+import { Resume } from '../types/types';
 // Mock API functions - replace with actual API calls
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 export const api = {
@@ -48,6 +49,34 @@ export const api = {
     return data.results;
   },
 
+  getResumesWithCursor: async (): Promise<{ results: Resume[]; cursor: number }> => {
+    // Same as getResumes, plus the change-feed cursor to poll from
+    const token = localStorage.getItem('token');
+    const response = await fetch(`${API_URL}/results`, {
+      headers: {
+        'Authorization': `Bearer ${token}`
+      }
+    });
+    if (!response.ok) {
+      throw new Error('Failed to fetch resumes');
+    }
+    return await response.json();
+  },
+
+  getResultChanges: async (since: number): Promise<{ cursor: number; changes: Partial<Resume>[] }> => {
+    // Results changed since the cursor (e.g. ATS scores filled in by the backend)
+    const token = localStorage.getItem('token');
+    const response = await fetch(`${API_URL}/results/changes?since=${since}`, {
+      headers: {
+        'Authorization': `Bearer ${token}`
+      }
+    });
+    if (!response.ok) {
+      throw new Error('Failed to fetch resume changes');
+    }
+    return await response.json();
+  },
+
   getResumeById: async (id: string) => {
     // Fetch resume by ID from backend API
     const token = localStorage.getItem('token');
@@ -66,6 +95,22 @@ export const api = {
     return data;
   },
 
+  getThumbnails: async (ids: string[]): Promise<{ thumbnails: Record<string, string>; pending: string[] }> => {
+    // Fetch the cached first-page previews; `pending` ones are being rendered, ask again later
+    if (ids.length === 0) return { thumbnails: {}, pending: [] };
+    const token = localStorage.getItem('token');
+    const response = await fetch(`${API_URL}/thumbnails?ids=${ids.join(',')}`, {
+      headers: {
+        'Authorization': `Bearer ${token}`
+      }
+    });
+    if (!response.ok) {
+      throw new Error('Failed to fetch thumbnails');
+    }
+    const data = await response.json();
+    return { thumbnails: data.thumbnails, pending: (data.pending || []).map(String) };
+  },
+
   generateResume: async (data: any) => {
     // Call backend API to generate resume
     const token = localStorage.getItem('token');
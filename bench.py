@@ -0,0 +1,178 @@
+# Throughput benchmarks for the API.
+#
+#   python bench.py scaling --workers 1 2 4 --path /results --path /pdf/{id}
+#   python bench.py coldstart
+#
+# scaling: each worker count gets its own server (serve.py) on a scratch
+# database, seeded with one user and one resume, then hammered with
+# concurrent clients.
+# coldstart: import-time profile of `res` plus time until the server is live
+# (/healthz) and ready (/readyz, i.e. warm-up finished).
+
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import httpx
+
+
+def wait_ready(base_url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/readyz", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"server at {base_url} never became ready")
+
+
+def seed(base_url: str, db_path: str) -> tuple[str, int]:
+    """Create a user through the API and insert one resume row for it."""
+    resp = httpx.post(f"{base_url}/signup", json={
+        "email": f"bench-{time.time_ns()}@example.com", "password": "bench", "name": "Bench",
+    })
+    resp.raise_for_status()
+    token = resp.json()["token"]
+    user_id = resp.json()["user"]["id"]
+    with open("resume.json", encoding="utf-8") as f:
+        content = f.read()
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute(
+        "INSERT INTO results (date, company, role, content, status, atsScore, profile_id, user_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (datetime.now().isoformat(), "Bench Inc", "Engineer", content, 1, 95, None, user_id),
+    )
+    conn.commit()
+    resume_id = c.lastrowid
+    conn.close()
+    return token, resume_id
+
+
+def hammer(url: str, token: str, concurrency: int, total: int) -> float:
+    """Fire `total` GETs at url from `concurrency` clients; return requests/second."""
+    headers = {"Authorization": f"Bearer {token}"}
+    per_client = total // concurrency
+
+    def run_client(_):
+        with httpx.Client(headers=headers, timeout=120) as client:
+            for _ in range(per_client):
+                client.get(url).raise_for_status()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run_client, range(concurrency)))
+    return per_client * concurrency / (time.perf_counter() - start)
+
+
+def scaling(args):
+    rows = []
+    for workers in args.workers:
+        port = args.port + workers
+        base_url = f"http://127.0.0.1:{port}"
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "bench.db")
+            env = dict(os.environ, CVSYNC_DB_PATH=db_path)
+            server = subprocess.Popen(
+                [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+                env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                wait_ready(base_url)
+                token, resume_id = seed(base_url, db_path)
+                for path in args.path:
+                    url = base_url + path.format(id=resume_id)
+                    hammer(url, token, args.concurrency, args.concurrency)   # warm-up
+                    rps = hammer(url, token, args.concurrency, args.requests)
+                    rows.append({"workers": workers, "path": path, "rps": round(rps, 1)})
+                    print(json.dumps(rows[-1]), flush=True)
+            finally:
+                server.terminate()
+                server.wait()
+
+    for path in args.path:
+        base = next(r["rps"] for r in rows if r["path"] == path)
+        for r in rows:
+            if r["path"] == path:
+                print(f"{path:<12} workers={r['workers']:<3} {r['rps']:>8.1f} req/s  speedup x{r['rps'] / base:.2f}")
+
+
+def import_profile(module: str, top: int) -> float:
+    """Print the slowest imports of `module` (python -X importtime); return total seconds."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|", 2)
+        rows.append((int(cumulative_us), name.rstrip()))
+    rows.sort(reverse=True)
+    for cumulative_us, name in rows[:top]:
+        print(f"{cumulative_us / 1e6:8.3f}s  {name}")
+    total = next((us for us, name in rows if name.strip() == module), 0)
+    return total / 1e6
+
+
+def coldstart(args):
+    total = import_profile("res", args.top)
+    print(f"import res: {total:.3f}s")
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, CVSYNC_DB_PATH=os.path.join(tmp, "bench.db"))
+        start = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(args.port), "--workers", "1"],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            live = ready = None
+            while ready is None and time.perf_counter() - start < 120:
+                try:
+                    if live is None and httpx.get(f"{base_url}/healthz", timeout=1).status_code == 200:
+                        live = time.perf_counter() - start
+                    if httpx.get(f"{base_url}/readyz", timeout=1).status_code == 200:
+                        ready = time.perf_counter() - start
+                except httpx.HTTPError:
+                    pass
+                time.sleep(0.02)
+        finally:
+            server.terminate()
+            server.wait()
+    print(f"live after {live:.3f}s, ready after {ready:.3f}s" if ready else "server never became ready")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CVSync benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("scaling", help="requests/second as the worker count grows")
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--path", action="append", help="endpoint to hit; {id} is the seeded resume id")
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument("--requests", type=int, default=2000)
+    p.add_argument("--port", type=int, default=8100)
+    p.set_defaults(func=scaling)
+
+    p = sub.add_parser("coldstart", help="import-time profile and time-to-ready")
+    p.add_argument("--top", type=int, default=15, help="number of slowest imports to list")
+    p.add_argument("--port", type=int, default=8099)
+    p.set_defaults(func=coldstart)
+
+    args = parser.parse_args()
+    if args.command == "scaling" and not args.path:
+        args.path = ["/results", "/pdf/{id}"]
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+DB_PATH = os.getenv("CVSYNC_DB_PATH", "results.db")
+BUSY_TIMEOUT_SECONDS = 30
+
+
+def get_connection() -> sqlite3.Connection:
+    """Open a fresh connection for the calling request.
+
+    Connections are never created at import time or shared between requests,
+    so nothing opened in the parent process leaks into forked workers. WAL
+    mode (set once in init_db) lets readers in every worker run alongside a
+    single writer; the busy timeout makes concurrent writers queue instead of
+    failing with "database is locked".
+    """
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_SECONDS)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _add_column(c, table: str, column: str, decl: str):
+    c.execute(f"PRAGMA table_info({table})")
+    if column not in {row[1] for row in c.fetchall()}:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def init_db():
+    """Create or migrate the schema. Run once, before any worker starts."""
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_SECONDS)
+    c = conn.cursor()
+    c.execute("PRAGMA journal_mode=WAL")
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            name TEXT
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company TEXT,
+            date TEXT,
+            role TEXT,
+            status INTEGER,
+            atsScore INTEGER,
+            content TEXT,
+            profile_id INTEGER,
+            user_id INTEGER
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS user_profile (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            phone TEXT,
+            email TEXT,
+            github TEXT,
+            resumes TEXT,
+            user_id INTEGER
+        )
+    """)
+    # One immutable row per parse of a profile's résumés; the highest version wins.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS profile_master (
+            profile_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            source_hash TEXT NOT NULL,
+            resume TEXT NOT NULL,
+            parse_tokens INTEGER,
+            created_at TEXT,
+            PRIMARY KEY (profile_id, version)
+        )
+    """)
+    # Version history of results.content, see versioning.py.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS result_versions (
+            result_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            source TEXT,
+            ats_score INTEGER,
+            created_at TEXT,
+            PRIMARY KEY (result_id, version)
+        )
+    """)
+    # Bumped on every UPDATE; read endpoints derive their ETags from it.
+    _add_column(c, "results", "row_version", "INTEGER NOT NULL DEFAULT 1")
+    _add_column(c, "user_profile", "row_version", "INTEGER NOT NULL DEFAULT 1")
+    # Filled in by the background ATS scoring after /generate_resume.
+    _add_column(c, "results", "originalScore", "INTEGER")
+    _add_column(c, "results", "score_status", "TEXT")
+    # Append-only change feed the dashboard polls with a cursor (seq).
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS result_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            result_id INTEGER NOT NULL,
+            user_id INTEGER,
+            kind TEXT NOT NULL,
+            created_at TEXT
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_result_changes_user ON result_changes (user_id, seq)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_results_user ON results (user_id, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_user_profile_user ON user_profile (user_id)")
+    conn.commit()
+    conn.close()
+
+
+def fail_stale_scores(older_than_seconds: float = 0) -> int:
+    """Mark background ATS scores still 'pending' after `older_than_seconds` as failed.
+
+    score_result runs in the process that served /generate_resume; if that
+    worker crashed or was stopped mid-score the row would stay pending for
+    good (the job description isn't stored, so it can't be re-queued). With
+    0 this must only run before any worker starts, as serve.py does.
+    """
+    cutoff = (datetime.now() - timedelta(seconds=older_than_seconds)).isoformat()
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute(
+        "INSERT INTO result_changes (result_id, user_id, kind, created_at) "
+        "SELECT id, user_id, 'score_failed', ? FROM results WHERE score_status = 'pending' AND date <= ?",
+        (datetime.now().isoformat(), cutoff),
+    )
+    c.execute(
+        "UPDATE results SET score_status = 'failed', row_version = row_version + 1 "
+        "WHERE score_status = 'pending' AND date <= ?",
+        (cutoff,),
+    )
+    failed = c.rowcount
+    conn.commit()
+    conn.close()
+    return failed
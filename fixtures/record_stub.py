@@ -0,0 +1,74 @@
+# Record synthetic fixtures for fixtures/corpus.jsonl with a stand-in Gemini
+# client, so the regression runner can replay in CI without credentials:
+#
+#   python fixtures/record_stub.py
+#   LLM_MODE=replay python regression.py fixtures/corpus.jsonl --min-mean-score 80
+#
+# The scores and résumés are made up. A replay run checks that the pipeline,
+# prompts, configs and routing still match the recorded calls (any change to
+# them is a fixture miss), not model quality. For real numbers, record against
+# the model instead:  LLM_MODE=record python regression.py fixtures/corpus.jsonl
+
+import hashlib
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+os.environ["LLM_MODE"] = "record"
+
+import llm_utils   # noqa: E402
+import regression  # noqa: E402
+
+RESUME = {
+    "name": "Candidate",
+    "profile": {
+        "summary": "Engineer with a record of shipping measurable improvements.",
+        "skills": {"Languages": ["Python", "SQL", "TypeScript"], "Tools": ["Docker", "Airflow", "React"]},
+        "core_competencies": ["Performance tuning", "Automation"],
+    },
+    "experience": [{
+        "company": "Acme Corp", "title": "Software Engineer", "location": None,
+        "start_date": "2021", "end_date": None, "summary": None,
+        "responsibilities": ["Cut p95 latency 40% by rewriting hot queries",
+                             "Automated reporting, saving 10 hours per week"],
+    }],
+    "projects": [],
+}
+
+
+def _digest(contents) -> int:
+    return int(hashlib.sha256(repr(contents).encode("utf-8")).hexdigest(), 16)
+
+
+def _usage(prompt, output):
+    return SimpleNamespace(prompt_token_count=prompt, candidates_token_count=output,
+                           thoughts_token_count=0, total_token_count=prompt + output)
+
+
+class StubModels:
+    def generate_content_stream(self, model, contents, config):
+        text = json.dumps(RESUME)
+        half = len(text) // 2
+        time.sleep(0.3)
+        yield SimpleNamespace(text=text[:half], usage_metadata=None)
+        time.sleep(0.2)
+        yield SimpleNamespace(text=text[half:], usage_metadata=_usage(900, 400))
+
+    def generate_content(self, model, contents, config):
+        time.sleep(0.4)
+        h = _digest(contents)
+        text = (f"ATS Score: {70 + h % 30}/100\n"
+                f"Confidence: {60 + h // 30 % 40}\n"
+                "Explanation: Synthetic evaluation recorded by fixtures/record_stub.py.")
+        return SimpleNamespace(text=text, usage_metadata=_usage(700, 60))
+
+
+if __name__ == "__main__":
+    llm_utils._client = SimpleNamespace(models=StubModels())
+    sys.argv = ["regression.py", os.path.join("fixtures", "corpus.jsonl")]
+    regression.main()
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+# Record/replay of model calls for offline regression runs.
+#
+#   LLM_MODE=record   call the model and save every completed response
+#   LLM_MODE=replay   never touch the network; serve saved responses
+#   LLM_MODE=live     (default) plain model calls
+#
+# A fixture is keyed by a hash of the call name, model, contents and config,
+# so changing a prompt or GenerateContentConfig is a fixture miss rather than
+# a silently stale answer. Chunk arrival times are saved too; replay sleeps
+# them out scaled by LLM_REPLAY_SPEED (0 = as fast as possible).
+
+LLM_MODE         = os.getenv("LLM_MODE", "live")
+LLM_FIXTURE_DIR  = os.getenv("LLM_FIXTURE_DIR", os.path.join("fixtures", "llm"))
+LLM_REPLAY_SPEED = float(os.getenv("LLM_REPLAY_SPEED", "0"))
+
+USAGE_FIELDS = ("prompt_token_count", "candidates_token_count", "thoughts_token_count", "total_token_count")
+
+
+class FixtureMissing(LookupError):
+    pass
+
+
+def _dump(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, (list, tuple)):
+        return [_dump(v) for v in value]
+    return value
+
+
+def fixture_key(name: str, model: str, contents, config) -> str:
+    payload = json.dumps(
+        {"name": name, "model": model, "contents": _dump(contents), "config": _dump(config)},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def fixture_path(name: str, key: str) -> str:
+    return os.path.join(LLM_FIXTURE_DIR, f"{name}-{key}.json")
+
+
+def usage_dict(usage) -> dict | None:
+    if usage is None:
+        return None
+    return {field: getattr(usage, field, None) for field in USAGE_FIELDS}
+
+
+def record(name: str, model: str, key: str, stream, started: float | None = None):
+    """Pass chunks through unchanged; save them once the response is complete.
+
+    `started` is the time.monotonic() at which the request was issued, so a
+    non-streaming response (complete before the first chunk is read) keeps
+    its latency in the fixture.
+    """
+    started = time.monotonic() if started is None else started
+    chunks = []
+    usage = None
+    for chunk in stream:
+        chunks.append({"t": round(time.monotonic() - started, 4), "text": chunk.text or ""})
+        usage = getattr(chunk, "usage_metadata", None) or usage
+        yield chunk
+    os.makedirs(LLM_FIXTURE_DIR, exist_ok=True)
+    path = fixture_path(name, key)
+    # Both attempts of a hedged call can finish and record the same key.
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"name": name, "model": model, "key": key, "chunks": chunks, "usage": usage_dict(usage)},
+                  f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def replay(name: str, key: str):
+    """Yield the saved chunks with their original spacing (scaled by LLM_REPLAY_SPEED)."""
+    path = fixture_path(name, key)
+    try:
+        with open(path, encoding="utf-8") as f:
+            fixture = json.load(f)
+    except FileNotFoundError:
+        raise FixtureMissing(f"no recorded response for {name} ({path}); re-run with LLM_MODE=record")
+    usage = fixture.get("usage")
+    previous = 0.0
+    chunks = fixture["chunks"]
+    for i, chunk in enumerate(chunks):
+        if LLM_REPLAY_SPEED:
+            time.sleep((chunk["t"] - previous) * LLM_REPLAY_SPEED)
+        previous = chunk["t"]
+        last = i == len(chunks) - 1
+        yield SimpleNamespace(
+            text=chunk["text"],
+            usage_metadata=SimpleNamespace(**usage) if usage and last else None,
+        )
@@ -0,0 +1,291 @@
+import functools
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from tenacity import Retrying, retry_if_exception
+
+import llm_replay
+
+# google.genai and langsmith take seconds to import; they are loaded on first
+# use (or by the warm-up task in res.py) rather than at import time.
+
+LLM_DEADLINE_SECONDS   = float(os.getenv("LLM_DEADLINE_SECONDS", "120"))
+LLM_MAX_ATTEMPTS       = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))
+HEDGE_DEFAULT_SECONDS  = float(os.getenv("LLM_HEDGE_DEFAULT_SECONDS", "10"))
+HEDGE_MIN_SAMPLES      = 20          # use the default until we have this many TTFC samples
+MIN_ATTEMPT_SECONDS    = 2.0         # don't start an attempt with less time than this left
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_MAX_THREADS", "16")),
+                               thread_name_prefix="llm")
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide Gemini client, building it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google import genai
+                _client = genai.Client(
+                    vertexai=True,
+                    project="cvsync-466917",
+                    location="global",
+                )
+    return _client
+
+
+def traceable(**kwargs):
+    """langsmith.traceable, but langsmith is only imported on the first call."""
+    def decorator(fn):
+        traced = None
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kw):
+            nonlocal traced
+            if traced is None:
+                from langsmith import traceable as langsmith_traceable
+                traced = langsmith_traceable(**kwargs)(fn)
+            return traced(*args, **kw)
+        return wrapper
+    return decorator
+
+
+# Per-call-name model overrides (e.g. set by the regression runner); they win
+# over the routed tier's model, see routing.model_for.
+model_overrides: dict[str, str] = {}
+
+
+class UsageTotals:
+    """Token counts and call counts per call name, for reporting."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals: dict[str, dict] = {}
+
+    def add(self, name: str, usage: dict | None):
+        with self.lock:
+            entry = self.totals.setdefault(name, {"calls": 0, **{f: 0 for f in llm_replay.USAGE_FIELDS}})
+            entry["calls"] += 1
+            for field, value in (usage or {}).items():
+                entry[field] += value or 0
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {name: dict(entry) for name, entry in self.totals.items()}
+
+    def reset(self):
+        with self.lock:
+            self.totals.clear()
+
+
+usage_totals = UsageTotals()
+_local = threading.local()
+
+
+def last_usage() -> dict | None:
+    """Token usage of the last model call completed on this thread."""
+    return getattr(_local, "usage", None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CallCancelled(Exception):
+    pass
+
+
+class Deadline:
+    """Absolute per-request time budget shared by every LLM call of one request."""
+
+    def __init__(self, seconds: float = LLM_DEADLINE_SECONDS):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+class LatencyTracker:
+    """Rolling window of time-to-first-chunk samples for one call type."""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self.lock:
+            self.samples.append(seconds)
+
+    def p95(self) -> float:
+        with self.lock:
+            if len(self.samples) < HEDGE_MIN_SAMPLES:
+                return HEDGE_DEFAULT_SECONDS
+            ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+_trackers: dict[str, LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def get_tracker(name: str) -> LatencyTracker:
+    with _trackers_lock:
+        if name not in _trackers:
+            _trackers[name] = LatencyTracker()
+        return _trackers[name]
+
+
+def is_transient(exc: BaseException) -> bool:
+    import httpx
+    from google.genai import errors as genai_errors
+    if isinstance(exc, genai_errors.APIError):
+        return exc.code in RETRYABLE_STATUS_CODES
+    return isinstance(exc, (httpx.TransportError, ConnectionError))
+
+
+class _Attempt:
+    """One in-flight model call that can be cancelled between chunks."""
+
+    def __init__(self, name: str, make_stream, tracker: LatencyTracker):
+        self.name = name
+        self.make_stream = make_stream
+        self.tracker = tracker
+        self.cancelled = threading.Event()
+        self.started = threading.Event()     # picked up by an executor thread
+        self.first_chunk = threading.Event()
+        self.responded = threading.Event()   # first chunk arrived, or the call ended
+        self.usage = None
+        self.future = _executor.submit(self._run)
+
+    def _run(self) -> str:
+        self.started.set()
+        try:
+            return self._consume()
+        finally:
+            self.responded.set()
+
+    def _consume(self) -> str:
+        started = time.monotonic()
+        stream = self.make_stream()
+        parts = []
+        usage = None
+        try:
+            for chunk in stream:
+                if self.cancelled.is_set():
+                    raise CallCancelled()
+                if not self.first_chunk.is_set():
+                    self.tracker.record(time.monotonic() - started)
+                    self.first_chunk.set()
+                    self.responded.set()
+                parts.append(chunk.text or "")
+                usage = getattr(chunk, "usage_metadata", None) or usage
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+        self.usage = llm_replay.usage_dict(usage)
+        usage_totals.add(self.name, self.usage)
+        return "".join(parts)
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+        self.future.cancel()
+
+
+def _hedged_call(name: str, make_stream, deadline: Deadline) -> str:
+    """Run make_stream once, and once more if the first chunk is later than p95.
+
+    The first attempt to finish successfully wins; the other one is cancelled.
+    """
+    tracker = get_tracker(name)
+    attempts = [_Attempt(name, make_stream, tracker)]
+    primary = attempts[0]
+    # The p95 samples start when the call runs, so time spent queued for an
+    # executor thread must not count; a saturated pool would otherwise hedge
+    # every call and double the load at the worst moment.
+    if primary.started.wait(deadline.remaining()):
+        hedge_after = min(tracker.p95(), deadline.remaining())
+        if not primary.responded.wait(hedge_after) and deadline.remaining() >= MIN_ATTEMPT_SECONDS:
+            attempts.append(_Attempt(name, make_stream, tracker))
+
+    pending = {a.future for a in attempts}
+    error = None
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded(f"{name} did not finish before the request deadline")
+            for future in done:
+                if future.exception() is None:
+                    winner = next(a for a in attempts if a.future is future)
+                    _local.usage = winner.usage
+                    return future.result()
+                error = future.exception()
+        raise error
+    finally:
+        for attempt in attempts:
+            attempt.cancel()
+
+
+def call_with_resilience(name: str, make_stream, deadline: Deadline | None = None) -> str:
+    """Call the model with jittered retries and hedging, bounded by deadline.
+
+    make_stream is a zero-argument callable returning an iterable of chunks
+    with a .text attribute (a streaming response, or a one-element list for
+    non-streaming calls). Retries happen only on transient errors and only
+    while the deadline leaves room for another attempt.
+    """
+    deadline = deadline or Deadline()
+
+    def _wait(retry_state) -> float:
+        backoff = min(30.0, 0.5 * 2 ** (retry_state.attempt_number - 1))
+        return min(random.uniform(0, backoff), deadline.remaining())
+
+    def _stop(retry_state) -> bool:
+        if retry_state.attempt_number >= LLM_MAX_ATTEMPTS:
+            return True
+        sleep = retry_state.upcoming_sleep or 0.0
+        return deadline.remaining() - sleep < MIN_ATTEMPT_SECONDS
+
+    retrying = Retrying(
+        retry=retry_if_exception(is_transient),
+        wait=_wait,
+        stop=_stop,
+        reraise=True,
+    )
+    return retrying(_hedged_call, name, make_stream, deadline)
+
+
+def call_model(name: str, model: str, contents, config, deadline: Deadline | None = None,
+               stream: bool = True) -> str:
+    """Run one model call through call_with_resilience, honouring LLM_MODE."""
+    mode = llm_replay.LLM_MODE
+    key = llm_replay.fixture_key(name, model, contents, config) if mode != "live" else None
+    if mode == "replay":
+        return call_with_resilience(name, lambda: llm_replay.replay(name, key), deadline)
+
+    client = get_client()
+
+    def make_stream():
+        started = time.monotonic()
+        if stream:
+            response = client.models.generate_content_stream(model=model, contents=contents, config=config)
+        else:
+            response = [client.models.generate_content(model=model, contents=contents, config=config)]
+        if mode == "record":
+            return llm_replay.record(name, model, key, response, started)
+        return response
+
+    return call_with_resilience(name, make_stream, deadline)
@@ -1,18 +1,187 @@
+import hashlib
+import io
 import json
+import os
+import threading
+import time
+from functools import lru_cache
+
 from jinja2 import Environment, FileSystemLoader
-from weasyprint import HTML
+
+# WeasyPrint pulls in Pango, Cairo and fontconfig; it is imported on the first
+# render (or by warm_up) instead of when this module is imported.
+THUMBNAIL_WIDTH = int(os.getenv("THUMBNAIL_WIDTH", "240"))   # pixels
+THUMBNAIL_DIR   = os.getenv("THUMBNAIL_DIR", "thumbnails")
+PDF_CACHE_DIR   = os.getenv("PDF_CACHE_DIR", "pdf_cache")
+CACHE_MAX_FILES = int(os.getenv("RENDER_CACHE_MAX_FILES", "5000"))   # per cache directory
+PRUNE_INTERVAL  = 60        # seconds between prune passes, per directory and process
+
+_last_prune: dict[str, float] = {}
+
+# FontConfiguration wraps a Pango font map, which must not be shared between
+# threads (Pango keeps one default font map per thread too), so every
+# threadpool thread that renders gets its own.
+_fonts = threading.local()
+
+
+@lru_cache(maxsize=None)
+def get_template(name: str = "resume.html"):
+    env = Environment(loader=FileSystemLoader("."))
+    return env.get_template(name)
+
+
+@lru_cache(maxsize=None)
+def template_hash(name: str = "resume.html") -> str:
+    """Changes whenever the template does, so cached renders are invalidated."""
+    with open(name, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def get_font_config():
+    font_config = getattr(_fonts, "config", None)
+    if font_config is None:
+        from weasyprint.text.fonts import FontConfiguration
+        font_config = _fonts.config = FontConfiguration()
+    return font_config
+
+
+def warm_up():
+    """Compile the template and load WeasyPrint + system fonts ahead of time.
+
+    Font configurations are per thread, so other threads still build their
+    own on their first render; the imports and template are shared.
+    """
+    from weasyprint import HTML
+    get_template()
+    HTML(string="<p>warm-up</p>").render(font_config=get_font_config())
+
 
 def generate_pdf_from_content(content: str, output_pdf_path: str = "resume.pdf"):
     """
     Renders the given resume content (JSON string or dict) to PDF using Jinja2 and WeasyPrint.
     """
+    from weasyprint import HTML
     if isinstance(content, str):
         data = json.loads(content)
     else:
         data = content
-    env = Environment(loader=FileSystemLoader("."))
-    
-    template = env.get_template("resume.html")
-    rendered_html = template.render(**data)
-    HTML(string=rendered_html).write_pdf(output_pdf_path)
+
+    rendered_html = get_template().render(**data)
+    HTML(string=rendered_html).write_pdf(output_pdf_path, font_config=get_font_config())
     return output_pdf_path
+
+
+def render_pdf_to_cache(content, path: str) -> str:
+    """Render into `path` atomically, so concurrent workers never serve a half-written file."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    generate_pdf_from_content(content, tmp_path)
+    os.replace(tmp_path, path)
+    maybe_prune(directory)
+    return path
+
+
+def cache_hit(path: str) -> bool:
+    """True if `path` is cached; a hit refreshes its mtime so pruning evicts it last."""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def prune_cache(directory: str, max_files: int = CACHE_MAX_FILES):
+    """Delete the least recently used files beyond `max_files`.
+
+    Entries are content-addressed, so an edit leaves the old render behind
+    rather than overwriting it; this is what eventually removes it. Safe to
+    run from several workers at once.
+    """
+    entries = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass
+    except FileNotFoundError:
+        return
+    entries.sort()
+    for _, path in entries[:max(0, len(entries) - max_files)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def maybe_prune(directory: str):
+    now = time.monotonic()
+    if now - _last_prune.get(directory, float("-inf")) < PRUNE_INTERVAL:
+        return
+    _last_prune[directory] = now
+    prune_cache(directory)
+
+
+def content_hash(data: dict) -> str:
+    """Stable hash of the template data; identical data renders identically."""
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def render_thumbnail(data: dict, width: int = THUMBNAIL_WIDTH) -> bytes:
+    """Render only the first page of the resume and rasterize it to a small PNG."""
+    from weasyprint import HTML
+    import pypdfium2 as pdfium
+
+    document = HTML(string=get_template().render(**data)).render(font_config=get_font_config())
+    first_page = document.copy(document.pages[:1]).write_pdf()
+
+    pdf = pdfium.PdfDocument(first_page)
+    try:
+        page = pdf[0]
+        image = page.render(scale=width / page.get_width()).to_pil()
+    finally:
+        pdf.close()
+    buf = io.BytesIO()
+    image.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+def thumbnail_path(data: dict, width: int = THUMBNAIL_WIDTH) -> str:
+    return os.path.join(THUMBNAIL_DIR, f"{content_hash(data)}-{template_hash()}-{width}.png")
+
+
+def cached_thumbnail(data: dict, width: int = THUMBNAIL_WIDTH) -> bytes | None:
+    """The cached first-page PNG for this content, or None without rendering."""
+    path = thumbnail_path(data, width)
+    try:
+        with open(path, "rb") as f:
+            png = f.read()
+    except FileNotFoundError:
+        return None
+    cache_hit(path)
+    return png
+
+
+def get_thumbnail(data: dict, width: int = THUMBNAIL_WIDTH) -> bytes:
+    """Return the cached first-page PNG for this content, rendering it on a miss.
+
+    The cache lives on disk, keyed by content and template hash, so every
+    worker process shares it and a content or template change simply misses.
+    """
+    png = cached_thumbnail(data, width)
+    if png is not None:
+        return png
+    path = thumbnail_path(data, width)
+    png = render_thumbnail(data, width)
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(png)
+    os.replace(tmp_path, path)
+    maybe_prune(THUMBNAIL_DIR)
+    return png
@@ -0,0 +1,137 @@
+# Offline quality/latency regression runs over a corpus of JD/resume pairs.
+#
+#   LLM_MODE=record python regression.py corpus.jsonl          # once, with credentials
+#   LLM_MODE=replay python regression.py corpus.jsonl          # CI, no network
+#   LLM_MODE=replay python regression.py corpus.jsonl --configs configs.json --min-mean-score 85
+#
+# fixtures/corpus.jsonl ships with synthetic fixtures (fixtures/record_stub.py)
+# and is what CI replays:
+#
+#   LLM_MODE=replay python regression.py fixtures/corpus.jsonl --min-mean-score 80
+#
+# corpus.jsonl: one {"id", "job_description", "resume"} object per line.
+# configs.json: a list of {"name", "routes": {call type: tier}, "models": {call name: model},
+# "max_rounds", "target_score"};
+# anything left out keeps the value res.py uses. Each pair runs the whole
+# pipeline (generate, then the rewrite/evaluate loop) and reports the final
+# ATS score, rounds used, tokens and wall-clock time.
+
+import argparse
+import json
+import statistics
+import sys
+import time
+
+import llm_replay
+import llm_utils
+import res
+import routing
+
+
+def load_jsonl(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_pair(pair: dict) -> dict:
+    llm_utils.usage_totals.reset()
+    started = time.perf_counter()
+    generated = res.generate(pair["job_description"], pair["resume"])
+    _, score, _, rounds = res.run_optimize(pair["job_description"], generated)
+    elapsed = time.perf_counter() - started
+    usage = llm_utils.usage_totals.snapshot()
+    return {
+        "id": pair.get("id"),
+        "ats_score": score,
+        "rounds": rounds,
+        "calls": sum(u["calls"] for u in usage.values()),
+        "prompt_tokens": sum(u["prompt_token_count"] for u in usage.values()),
+        "total_tokens": sum(u["total_token_count"] for u in usage.values()),
+        "seconds": round(elapsed, 3),
+    }
+
+
+def run_config(config: dict, corpus: list[dict]) -> list[dict]:
+    defaults = (res.MAX_ROUNDS, res.TARGET_SCORE)
+    llm_utils.model_overrides.clear()
+    llm_utils.model_overrides.update(config.get("models", {}))
+    routing.route_overrides.clear()
+    routing.route_overrides.update(config.get("routes", {}))
+    routing.tier_stats.reset()
+    res.MAX_ROUNDS = config.get("max_rounds", res.MAX_ROUNDS)
+    res.TARGET_SCORE = config.get("target_score", res.TARGET_SCORE)
+    rows = []
+    try:
+        for pair in corpus:
+            try:
+                row = run_pair(pair)
+            except Exception as exc:
+                row = {"id": pair.get("id"), "error": f"{type(exc).__name__}: {exc}"}
+            row["config"] = config["name"]
+            rows.append(row)
+            print(json.dumps(row), flush=True)
+    finally:
+        res.MAX_ROUNDS, res.TARGET_SCORE = defaults
+        llm_utils.model_overrides.clear()
+        routing.route_overrides.clear()
+    return rows
+
+
+def summarize(name: str, rows: list[dict]) -> dict:
+    ok = [r for r in rows if "error" not in r]
+    summary = {"config": name, "pairs": len(rows), "errors": len(rows) - len(ok)}
+    if ok:
+        summary.update(
+            mean_ats_score=round(statistics.mean(r["ats_score"] for r in ok), 1),
+            mean_rounds=round(statistics.mean(r["rounds"] for r in ok), 2),
+            total_tokens=sum(r["total_tokens"] for r in ok),
+            mean_tokens=round(statistics.mean(r["total_tokens"] for r in ok)),
+            p50_seconds=round(statistics.median(r["seconds"] for r in ok), 3),
+            max_seconds=max(r["seconds"] for r in ok),
+        )
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the optimize pipeline over a JD/resume corpus.")
+    parser.add_argument("corpus", help="JSONL file of {id, job_description, resume}")
+    parser.add_argument("--configs", help="JSON file with a list of configurations to compare")
+    parser.add_argument("--out", help="write every per-pair row and the summaries here (JSON)")
+    parser.add_argument("--min-mean-score", type=float, default=None,
+                        help="exit non-zero if any configuration's mean ATS score is below this")
+    args = parser.parse_args()
+
+    corpus = load_jsonl(args.corpus)
+    configs = [{"name": "baseline"}]
+    if args.configs:
+        with open(args.configs, encoding="utf-8") as f:
+            configs = json.load(f)
+
+    # These are otherwise imported inside the first model call, which would
+    # land in the first pair's wall-clock time.
+    import langsmith  # noqa: F401
+    from google.genai import types  # noqa: F401
+
+    print(f"mode={llm_replay.LLM_MODE} pairs={len(corpus)} configs={len(configs)}", file=sys.stderr)
+    all_rows, summaries = [], []
+    for config in configs:
+        rows = run_config(config, corpus)
+        all_rows.extend(rows)
+        summary = summarize(config["name"], rows)
+        summary["tiers"] = routing.tier_stats.snapshot()
+        summaries.append(summary)
+
+    for summary in summaries:
+        print(json.dumps(summary))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"mode": llm_replay.LLM_MODE, "rows": all_rows, "summaries": summaries}, f, indent=2)
+
+    failed = any(s["errors"] for s in summaries)
+    if args.min_mean_score is not None:
+        failed |= any(s.get("mean_ats_score", 0) < args.min_mean_score for s in summaries)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
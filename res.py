@@ -1,29 +1,40 @@
-from google import genai
-from google.genai import types
 import base64
 import sqlite3
 from datetime import datetime, timedelta
-from fastapi import FastAPI, Request, Depends, HTTPException, status
+from fastapi import FastAPI, Request, Depends, HTTPException, status, BackgroundTasks
 import os
 from pydantic import BaseModel
-from fastapi.responses import JSONResponse, FileResponse
-import uvicorn
-from langsmith import traceable
+from fastapi.responses import JSONResponse, FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware 
 import re
 from typing import List, Optional, Dict
 import json
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+import hashlib
+import threading
+import signal
+import logging
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
 from dotenv import load_dotenv
-from pdf_utils import generate_pdf_from_content
+import pdf_utils
+from db import fail_stale_scores, get_connection, init_db
+import versioning
+from llm_utils import (Deadline, DeadlineExceeded, call_model, get_client, traceable,
+                       usage_totals, LLM_DEADLINE_SECONDS)
+import routing
+from pydantic import ValidationError
 
 load_dotenv()
 
 
 TARGET_SCORE   = 90          # stop when ATS score ≥ this value
 MAX_ROUNDS     = 3 
+CONFIDENCE_FLOOR   = 70      # cheap-tier ATS scores below this confidence are re-scored one tier up
+NEAR_TARGET_MARGIN = 5       # ...as are scores this close to TARGET_SCORE, where the loop decision flips
+MAX_THUMBNAIL_BATCH = 100    # previews per /thumbnails request
+MAX_CHANGES    = 500         # rows per /results/changes response
+DRAIN_SECONDS  = float(os.getenv("DRAIN_SECONDS", "5"))   # /readyz fails this long after SIGTERM before shutdown
 app = FastAPI()
 
 origins = [
@@ -39,6 +50,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(DeadlineExceeded)
+def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(content={"error": str(exc)}, status_code=504)
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+# Everything below is per-user, so never let shared caches keep it; browsers
+# may keep a copy but must revalidate (cheap thanks to the ETags).
+PRIVATE_REVALIDATE = "private, no-cache"
+
+
 class Contact(BaseModel):
     phone: str
     email: str
@@ -92,6 +130,7 @@ class EvaluateRequest(BaseModel):
 class OptimizeRequest(BaseModel):
     job_description: str
     resume: str
+    result_id: int | None = None   # when set, every round is kept in the version history
 
 class SaveSelectedResumeRequest(BaseModel):
     id: str
@@ -123,10 +162,18 @@ SECRET_KEY = os.getenv("FASTAPI_SECRET", "change-me")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    # passlib + bcrypt are only needed for signup/login; load them on first use.
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def create_access_token(data: dict, expires_delta: int = ACCESS_TOKEN_EXPIRE_MINUTES) -> str:
+    from jose import jwt
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=expires_delta)
     to_encode.update({"exp": expire})
@@ -134,14 +181,15 @@ def create_access_token(data: dict, expires_delta: int = ACCESS_TOKEN_EXPIRE_MIN
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def get_current_user(request: Request):
+    from jose import JWTError, jwt
     auth = request.headers.get("Authorization")
     if not auth or not auth.startswith("Bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
@@ -156,7 +204,7 @@ def get_current_user(request: Request):
     if user_id is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Invalid token")
-    conn = sqlite3.connect("results.db")
+    conn = get_connection()
     c = conn.cursor()
     c.execute("SELECT id, email, name FROM users WHERE id = ?", (user_id,))
     row = c.fetchone()
@@ -168,7 +216,7 @@ def get_current_user(request: Request):
 
 @app.post("/signup")
 def signup(data: SignupRequest):
-    conn = sqlite3.connect("results.db")
+    conn = get_connection()
     c = conn.cursor()
     try:
         hashed = get_password_hash(data.password)
@@ -192,7 +240,7 @@ def signup(data: SignupRequest):
 
 @app.post("/login")
 def login(data: LoginRequest):
-    conn = sqlite3.connect("results.db")
+    conn = get_connection()
     c = conn.cursor()
     c.execute("SELECT id, password, name FROM users WHERE email = ?", (data.email,))
     row = c.fetchone()
@@ -208,31 +256,128 @@ def login(data: LoginRequest):
     }
 
 
+warmed_up = threading.Event()
+
+
+def warm_up():
+    """Load the heavy dependencies before the first request needs them."""
+    steps = [
+        ("gemini client", get_client),
+        ("pdf renderer", pdf_utils.warm_up),
+        ("password hashing", get_pwd_context),
+        ("jwt", lambda: __import__("jose.jwt")),
+        ("tracing", lambda: __import__("langsmith")),
+    ]
+    for name, step in steps:
+        try:
+            step()
+        except Exception:
+            # Leave it to be retried (and reported) on first use.
+            logger.exception("warm-up step %r failed", name)
+    warmed_up.set()
+
+
 @app.on_event("startup")
-def create_user_table():
-    conn = sqlite3.connect("results.db")
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            name TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+def create_tables():
+    # serve.py migrates once before forking workers; a plain `uvicorn res:app`
+    # (single process) still migrates here.
+    if os.getenv("CVSYNC_SCHEMA_READY") != "1":
+        init_db()
+        fail_stale_scores()
+    else:
+        # A restarted worker: scores older than the scoring deadline (twice,
+        # for the final writes) can't still be running in any live worker.
+        fail_stale_scores(2 * LLM_DEADLINE_SECONDS)
 
 
+@app.on_event("startup")
+def start_warm_up():
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
 
-@traceable(run_type="llm", name="generate_resume")
-def generate(job_description, current_resume):
-    client = genai.Client(
-        vertexai=True,
-        project="cvsync-466917",
-        location="global",
+
+@app.on_event("startup")
+def install_drain_handler():
+    """On SIGTERM, fail /readyz for DRAIN_SECONDS before the worker stops listening.
+
+    uvicorn's own handler closes the sockets on its next tick and runs the
+    shutdown hooks only after in-flight requests finish, so a load balancer
+    would never see readiness fail. Startup hooks run while uvicorn's handler
+    is installed; we wrap it and hand the signal on once the drain period is
+    over. A second SIGTERM (or DRAIN_SECONDS=0) shuts down immediately.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    server_handler = signal.getsignal(signal.SIGTERM)
+    if not callable(server_handler):
+        return
+
+    def handle_sigterm(sig, frame):
+        if getattr(app.state, "draining", False) or DRAIN_SECONDS <= 0:
+            server_handler(sig, frame)
+            return
+        app.state.draining = True
+        logger.info("SIGTERM received; draining for %.1fs before shutdown", DRAIN_SECONDS)
+        timer = threading.Timer(DRAIN_SECONDS, server_handler, args=(sig, frame))
+        timer.daemon = True
+        timer.start()
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+
+@app.get("/healthz")
+def liveness():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readiness():
+    if getattr(app.state, "draining", False):
+        return JSONResponse(content={"status": "draining"}, status_code=503)
+    if not warmed_up.is_set():
+        return JSONResponse(content={"status": "warming up"}, status_code=503)
+    try:
+        conn = get_connection()
+        conn.execute("SELECT 1 FROM results LIMIT 1")
+        conn.close()
+    except sqlite3.Error as exc:
+        return JSONResponse(content={"status": "unavailable", "error": str(exc)}, status_code=503)
+    return {"status": "ready"}
+
+
+@app.get("/metrics/llm")
+def llm_metrics():
+    """Routing, per-tier latency/cost/escalation and token totals for this worker process."""
+    return {
+        "routes": {call_type: routing.route(call_type) for call_type in routing.DEFAULT_ROUTES},
+        "max_tier": routing.MAX_TIER,
+        "tiers": routing.tier_stats.snapshot(),
+        "usage": usage_totals.snapshot(),
+    }
+
+
+def resume_schema_problem(text: str) -> str | None:
+    """Escalation check for JSON résumé output: None if it validates against Resume."""
+    try:
+        Resume.model_validate_json(text)
+    except ValidationError as exc:
+        return f"{exc.error_count()} schema errors"
+    return None
+
+
+
+def generate(job_description, current_resume, deadline: Deadline | None = None):
+    # One deadline for every tier, so an escalation can't double the budget.
+    deadline = deadline or Deadline()
+    return routing.run_tiered(
+        "generate_resume",
+        lambda t: generate_on(t, job_description, current_resume, deadline),
+        resume_schema_problem,
     )
 
+@traceable(run_type="llm", name="generate_resume")
+def generate_on(tier: str, job_description, current_resume, deadline: Deadline | None = None):
+    from google.genai import types
+
     msg1_text1 = types.Part.from_text(text=f"""You will receive a **Job Description (JD)** and a **Current Resume**.  
 Your mission: rewrite *only* the **Work Experience** and **Skills** sections so the resume aligns crisply with the JD—while staying 100 % truthful to the source material.
 
@@ -276,7 +421,7 @@ Professional Summary (3-4 lines)
 • Summarize the candidate's top 3-4 selling points, mirroring the JD's highest-priority competencies and metrics.""")
     si_text1 = """You are an elite resume-optimization assistant. Your goal is to transform a candidate's resume so that it aligns crisply with a specific job description, while remaining 100 % truthful to the source material. You must emphasize impact, metrics, and the exact keywords that modern Applicant Tracking Systems (ATS) look for."""
 
-    model = "gemini-2.5-flash"
+    model = routing.model_for("generate_resume", tier)
     contents = [
         types.Content(
             role="user",
@@ -306,7 +451,7 @@ Professional Summary (3-4 lines)
         )],
         system_instruction=[types.Part.from_text(text=si_text1)],
         thinking_config=types.ThinkingConfig(
-            thinking_budget=-1,
+            thinking_budget=routing.thinking_budget(tier),
         ),
         response_schema = Resume.model_json_schema(),
         response_mime_type = "application/json",
@@ -314,46 +459,92 @@ Professional Summary (3-4 lines)
 
     )
 
-    result = ""
-    for chunk in client.models.generate_content_stream(
-        model=model,
-        contents=contents,
-        config=generate_content_config,
-    ):
-        result += chunk.text
-    return result
+    return call_model("generate_resume", model, contents, generate_content_config, deadline)
 
-@app.post("/generate_resume")
-def generate_resume(data: ResumeRequest, user_id: int = Depends(get_current_user)):
-    user_id = user_id["id"]
-    output = generate(data.job_description, data.current_resume)
-    # Store the result in a SQLite database
-    conn = sqlite3.connect("results.db")
+def record_change(c, result_id: int, kind: str):
+    """Append to the change feed; call inside the transaction that made the change."""
+    c.execute(
+        "INSERT INTO result_changes (result_id, user_id, kind, created_at) "
+        "SELECT id, user_id, ?, ? FROM results WHERE id = ?",
+        (kind, datetime.now().isoformat(), result_id),
+    )
+
+def score_result(result_id: int, job_description: str, generated: str, original: str):
+    """Background task: score the generated and the original résumé in parallel and store both."""
+    deadline = Deadline()
+    try:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            generated_future = pool.submit(evaluate_resume, job_description, generated, deadline)
+            original_future = pool.submit(evaluate_resume, job_description, original, deadline)
+            ats_score, _ = generated_future.result()
+            original_score, _ = original_future.result()
+    except Exception:
+        logger.exception("background ATS scoring failed for resume %s", result_id)
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("UPDATE results SET score_status = 'failed', row_version = row_version + 1 "
+                  "WHERE id = ? AND score_status = 'pending'", (result_id,))
+        if c.rowcount:
+            record_change(c, result_id, "score_failed")
+        conn.commit()
+        conn.close()
+        return
+    # Only while still pending: a /saveselectedresume in the meantime replaced
+    # the content these scores were computed for.
+    conn = get_connection()
     c = conn.cursor()
     c.execute(
-        "CREATE TABLE IF NOT EXISTS results (id INTEGER PRIMARY KEY AUTOINCREMENT,company TEXT,date TEXT,role TEXT,status INTEGER,atsScore INTEGER,content TEXT, profile_id INTEGER, user_id INTEGER)"
+        "UPDATE results SET atsScore = ?, originalScore = ?, score_status = 'done', row_version = row_version + 1 "
+        "WHERE id = ? AND score_status = 'pending'",
+        (ats_score, original_score, result_id),
     )
+    if c.rowcount:
+        record_change(c, result_id, "scored")
+    conn.commit()
+    conn.close()
+
+@app.post("/generate_resume")
+def generate_resume(data: ResumeRequest, background_tasks: BackgroundTasks, user_id: int = Depends(get_current_user)):
+    user_id = user_id["id"]
+    resume_text, prompt_stats = resolve_resume_text(data.profile_id, user_id, data.current_resume)
+    output = generate(data.job_description, resume_text)
+    # Store the result in a SQLite database; the ATS scores are filled in by score_result.
+    conn = get_connection()
+    c = conn.cursor()
     c.execute(
-        "INSERT INTO results (date, company, role, content, status, atsScore, profile_id, user_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-        (datetime.now().isoformat(), data.companyName, data.role, output, 1, 95, data.profile_id, user_id)
+        "INSERT INTO results (date, company, role, content, status, atsScore, profile_id, user_id, score_status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (datetime.now().isoformat(), data.companyName, data.role, output, 1, None, data.profile_id, user_id, "pending")
     )
+    result_id = c.lastrowid
+    record_change(c, result_id, "created")
     conn.commit()
     conn.close()
-    return JSONResponse(content={"result": output, "id": c.lastrowid})
+    versioning.record_version(result_id, output, "generated")
+    # BackgroundTasks run in order: score first so it doesn't wait on a render.
+    # The original score is for the text the prompt actually got (possibly the master).
+    background_tasks.add_task(score_result, result_id, data.job_description, output, resume_text)
+    background_tasks.add_task(refresh_thumbnail, result_id)
+    return JSONResponse(content={"result": output, "id": result_id, "scoreStatus": "pending",
+                                 "prompt_stats": prompt_stats})
 
 @app.get("/results")
-def get_all_results(user_id: int = Depends(get_current_user)):
+def get_all_results(request: Request, user_id: int = Depends(get_current_user)):
     user_id=user_id["id"]
-    conn = sqlite3.connect("results.db")
+    conn = get_connection()
     c = conn.cursor()
+    # Cheap version probe first: a 304 never reads the resume contents.
+    c.execute("SELECT id, row_version FROM results WHERE user_id = ? ORDER BY id DESC", (user_id,))
+    etag = make_etag("results", user_id, c.fetchall())
+    if etag_matches(request, etag):
+        conn.close()
+        return not_modified(etag, PRIVATE_REVALIDATE)
     c.execute(
-        "CREATE TABLE IF NOT EXISTS results (id INTEGER PRIMARY KEY AUTOINCREMENT,company TEXT,date TEXT,role TEXT,status INTEGER,atsScore INTEGER,content TEXT, profile_id INTEGER, user_id INTEGER)"
-    )
-    c.execute(
-        "SELECT id, company, date, role, status, atsScore, content FROM results WHERE user_id = ? ORDER BY id DESC",
+        "SELECT id, company, date, role, status, atsScore, content, originalScore, score_status FROM results WHERE user_id = ? ORDER BY id DESC",
         (user_id,),
     )
     rows = c.fetchall()
+    c.execute("SELECT COALESCE(MAX(seq), 0) FROM result_changes WHERE user_id = ?", (user_id,))
+    cursor = c.fetchone()[0]
     conn.close()
     results = []
     for row in rows:
@@ -364,21 +555,71 @@ def get_all_results(user_id: int = Depends(get_current_user)):
             "role": row[3],
             "status": "generated" if row[4] == 0 else "optimized",
             "atsScore": row[5],
-            "content": row[6]
+            "content": row[6],
+            "originalScore": row[7],
+            "scoreStatus": row[8] or "done"
         })
-    return {"results": results}
+    return JSONResponse(content={"results": results, "cursor": cursor},
+                        headers={"ETag": etag, "Cache-Control": PRIVATE_REVALIDATE})
+
+@app.get("/results/changes")
+def get_result_changes(since: int = 0, user_id: int = Depends(get_current_user)):
+    """Change feed: results changed after cursor `since`, newest state only (no content)."""
+    user_id = user_id["id"]
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute(
+        "SELECT seq, result_id, kind FROM result_changes WHERE user_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+        (user_id, since, MAX_CHANGES),
+    )
+    changes = c.fetchall()
+    cursor = changes[-1][0] if changes else since
+    latest = {}
+    for seq, result_id, kind in changes:
+        latest[result_id] = kind
+    rows = []
+    if latest:
+        placeholders = ",".join("?" * len(latest))
+        c.execute(
+            f"SELECT id, status, atsScore, originalScore, score_status FROM results WHERE user_id = ? AND id IN ({placeholders})",
+            (user_id, *latest),
+        )
+        rows = c.fetchall()
+    conn.close()
+    return {
+        "cursor": cursor,
+        "changes": [
+            {
+                "id": row[0],
+                "kind": latest[row[0]],
+                "status": "generated" if row[1] == 0 else "optimized",
+                "atsScore": row[2],
+                "originalScore": row[3],
+                "scoreStatus": row[4] or "done",
+            }
+            for row in rows
+        ],
+    }
 
-@traceable(run_type="llm", name="rewrite_resume")
 def rewrite_resume(job_desc: str,
                    resume: str,
-                   feedback: str | None = None) -> str:
-    client = genai.Client(
-        vertexai=True,
-        project="cvsync-466917",
-        location="global",
-    )
+                   feedback: str | None = None,
+                   deadline: Deadline | None = None) -> str:
     """Return an updated résumé (Work Experience + Skills) aligned to JD.
        Optionally incorporates ATS feedback from a previous round."""
+    deadline = deadline or Deadline()
+    # Follow-up rounds only address feedback, so they default to a cheaper tier.
+    return routing.run_tiered(
+        "rewrite_resume_followup" if feedback else "rewrite_resume",
+        lambda t: rewrite_resume_on(t, job_desc, resume, feedback, deadline),
+        resume_schema_problem,
+    )
+
+@traceable(run_type="llm", name="rewrite_resume")
+def rewrite_resume_on(tier: str, job_desc: str, resume: str,
+                      feedback: str | None = None,
+                      deadline: Deadline | None = None) -> str:
+    from google.genai import types
     
     # ---- build dynamic prompt ----------------------------------
     base_user_prompt =types.Part.from_text(text= f"""
@@ -427,7 +668,7 @@ Professional Summary (3-4 lines)
         "You are an elite resume-optimization assistant. Your goal is to transform a candidate's resume so that it aligns crisply with a specific job description, while remaining 100 % truthful to the source material. You must emphasize impact, metrics, and the exact keywords that modern Applicant Tracking Systems (ATS) look for.
 """
 
-    model = "gemini-2.5-flash"
+    model = routing.model_for("rewrite_resume", tier)
     contents = [
         types.Content(
             role="user",
@@ -457,30 +698,42 @@ Professional Summary (3-4 lines)
         )],
         system_instruction=[types.Part.from_text(text=system_instruction)],
         thinking_config=types.ThinkingConfig(
-            thinking_budget=-1,
+            thinking_budget=routing.thinking_budget(tier),
         ),
         response_schema = Resume.model_json_schema(),
         response_mime_type = "application/json",
     )
 
-    result = ""
-    for chunk in client.models.generate_content_stream(
-        model=model,
-        contents=contents,
-        config=generate_content_config,
-    ):
-        result += chunk.text
-    return result
+    return call_model("rewrite_resume", model, contents, generate_content_config, deadline)
 
 
-@traceable(run_type="llm", name="evaluate_resume")
-def evaluate_resume(job_desc: str, resume: str) -> tuple[int, str]:
-    client = genai.Client(
-        vertexai=True,
-        project="cvsync-466917",
-        location="global",
-    )
+def evaluate_resume(job_desc: str, resume: str,
+                    deadline: Deadline | None = None) -> tuple[int, str]:
     """Return (ATS score, explanation)."""
+    deadline = deadline or Deadline()
+
+    def check(result):
+        score, _, confidence = result
+        if score is None:
+            return "no score in the response"
+        if confidence is not None and confidence < CONFIDENCE_FLOOR:
+            return f"low confidence ({confidence})"
+        if abs(score - TARGET_SCORE) <= NEAR_TARGET_MARGIN:
+            return f"score {score} is near the target {TARGET_SCORE}"
+        return None
+
+    score, explanation, _ = routing.run_tiered(
+        "evaluate_resume",
+        lambda t: evaluate_resume_on(t, job_desc, resume, deadline),
+        check,
+    )
+    return score or 0, explanation
+
+@traceable(run_type="llm", name="evaluate_resume")
+def evaluate_resume_on(tier: str, job_desc: str, resume: str,
+                       deadline: Deadline | None = None) -> tuple[int | None, str, int | None]:
+    """Score on one model tier. Return (ATS score, explanation, confidence); None when missing."""
+    from google.genai import types
     eval_prompt = types.Part.from_text(text= f"""
 Resume:
 {resume}
@@ -495,13 +748,14 @@ Instructions:
 
 Output format:
 ATS Score: [Score]/100
+Confidence: [0-100, how certain you are of the score]
 Explanation: [Explanation]
 """)
     system_instructions = """
         You are an elite ATS evaluator. Your task is to analyze a résumé against a job description and score.
     """
     
-    model = "gemini-2.5-flash"
+    model = routing.model_for("evaluate_resume", tier)
     content = [
         types.Content(
             role="user",
@@ -531,45 +785,115 @@ Explanation: [Explanation]
         )],
         system_instruction=[types.Part.from_text(text=system_instructions)],
         thinking_config=types.ThinkingConfig(
-            thinking_budget=-1,
+            thinking_budget=routing.thinking_budget(tier),
         ),
     )
-    resp = client.models.generate_content(
-        model    = model,
-        contents = content,
-        config   = generate_content_configs,
-    )
-    text = resp.text
+    text = call_model("evaluate_resume", model, content, generate_content_configs, deadline, stream=False)
     # --- extract numeric score ----------------------------------
     match = re.search(r"ATS\s+Score:\s*(\d+)\s*/\s*100", text)
-    score = int(match.group(1)) if match else 0
+    score = int(match.group(1)) if match else None
+    confidence_match = re.search(r"Confidence:\s*(\d+)", text)
+    confidence = int(confidence_match.group(1)) if confidence_match else None
     explanation = re.sub(r"^.*Explanation:\s*", "", text, flags=re.S).strip()
-    return score, explanation
+    return score, explanation, confidence
+
+def parse_resume(resumes: list[str], deadline: Deadline | None = None) -> Resume:
+    """Merge a profile's raw résumé texts into one validated, structured Resume."""
+    deadline = deadline or Deadline()
+    text = routing.run_tiered(
+        "parse_resume",
+        lambda t: parse_resume_on(t, resumes, deadline),
+        resume_schema_problem,
+    )
+    return Resume.model_validate_json(text)
+
+@traceable(run_type="llm", name="parse_resume")
+def parse_resume_on(tier: str, resumes: list[str], deadline: Deadline | None = None) -> str:
+    from google.genai import types
+    sources = "\n\n".join(f"--- Resume {i} ---\n{text}" for i, text in enumerate(resumes, 1))
+    parse_prompt = types.Part.from_text(text=f"""
+Convert the résumé text below into the JSON schema you were given.
+
+{sources}
+
+Instructions:
+• If there are several résumés, merge them into one: each company/title appears once, each skill appears once.
+• Keep every role, project, date and achievement exactly as written — do not rewrite, embellish or invent.
+• Drop bullets that repeat another bullet word for word.
+""")
+    system_instruction = """
+        You are a precise résumé parser. You extract structure; you never change content.
+    """
+
+    model = routing.model_for("parse_resume", tier)
+    contents = [
+        types.Content(
+            role="user",
+            parts=[
+                parse_prompt
+            ]
+        ),
+    ]
+
+    generate_content_config = types.GenerateContentConfig(
+        temperature=0,
+        top_p=1,
+        seed=0,
+        max_output_tokens=65535,
+        system_instruction=[types.Part.from_text(text=system_instruction)],
+        thinking_config=types.ThinkingConfig(
+            thinking_budget=routing.thinking_budget(tier),
+        ),
+        response_schema = Resume.model_json_schema(),
+        response_mime_type = "application/json",
+    )
+
+    return call_model("parse_resume", model, contents, generate_content_config, deadline)
 
 @app.post("/evaluate_ats")
 def evaluate_ats(data: EvaluateRequest):
     score, explanation = evaluate_resume(data.job_description, data.resume)
     return {"atsScore": score, "explanation": explanation}
 
-@app.post("/optimize_resume")
-def optimize_resume_api(data: OptimizeRequest):
-    job_desc = data.job_description
-    resume = data.resume
+def run_optimize(job_desc: str, resume: str, deadline: Deadline | None = None,
+                 on_round=None) -> tuple[str, int, str, int]:
+    """Rewrite/evaluate until the score reaches TARGET_SCORE or MAX_ROUNDS is hit.
+
+    Returns (resume, score, explanation, rounds used). on_round(roundno, resume, score)
+    is called after every round.
+    """
+    deadline = deadline or Deadline(LLM_DEADLINE_SECONDS * MAX_ROUNDS)   # shared by every round
     feedback = None
     for roundno in range(1, MAX_ROUNDS + 1):
-        resume = rewrite_resume(job_desc, resume, feedback)
-        score, explanation = evaluate_resume(job_desc, resume)
+        resume = rewrite_resume(job_desc, resume, feedback, deadline)
+        score, explanation = evaluate_resume(job_desc, resume, deadline)
+        if on_round:
+            on_round(roundno, resume, score)
         if score >= TARGET_SCORE:
             break
         feedback = (
             f"The current ATS score is {score}/100. "
             f"Improve the résumé by addressing these weaknesses: {explanation}"
         )
+    return resume, score, explanation, roundno
+
+@app.post("/optimize_resume")
+def optimize_resume_api(data: OptimizeRequest, user_id: int = Depends(get_current_user)):
+    on_round = None
+    if data.result_id is not None:
+        if not owns_result(data.result_id, user_id["id"]):
+            return JSONResponse(content={"error": "Resume not found"}, status_code=404)
+        def on_round(roundno, resume, score):
+            versioning.record_version(data.result_id, resume, f"optimize round {roundno}", score)
+    resume, score, explanation, _ = run_optimize(data.job_description, data.resume, on_round=on_round)
     return {"optimized_resume": resume, "final_score": score, "explanation": explanation}
 
 @app.post("/saveselectedresume")
-def save_selected_resume(data: SaveSelectedResumeRequest):
+def save_selected_resume(data: SaveSelectedResumeRequest, background_tasks: BackgroundTasks,
+                         user_id: int = Depends(get_current_user)):
     integer_number = int(data.id)
+    if not owns_result(integer_number, user_id["id"]):
+        return JSONResponse(content={"error": "Resume not found"}, status_code=404)
     if data.status == "optimized":
         status = 1
         score = data.optimizedscore
@@ -578,30 +902,43 @@ def save_selected_resume(data: SaveSelectedResumeRequest):
         status = 0
         score = data.atsscore
         content = data.generatedResume
-    conn = sqlite3.connect("results.db")
+    conn = get_connection()
     c = conn.cursor()
-    c.execute("UPDATE results SET status = ?, atsScore = ?, content = ? WHERE id = ?", (status, score, content, integer_number))
+    # Saving takes the row out of 'pending': the background score was for the old content.
+    c.execute("UPDATE results SET status = ?, atsScore = ?, content = ?, score_status = 'done', row_version = row_version + 1 WHERE id = ? AND user_id = ?",
+              (status, score, content, integer_number, user_id["id"]))
+    updated = c.rowcount
+    if updated:
+        record_change(c, integer_number, "saved")
     conn.commit()
     conn.close()
+    if updated != 1:
+        return JSONResponse(content={"error": "Resume not found"}, status_code=404)
+    versioning.record_version(integer_number, content, f"saved {data.status}", score)
+    background_tasks.add_task(refresh_thumbnail, integer_number)
     return {"message": "Status, score, and content updated successfully", "id": data.id, "status": data.status, "score": score, "content": content}
 
 @app.get("/resume/{resume_id}")
-def get_resume_by_id(resume_id: str, user_id: int = Depends(get_current_user)):
+def get_resume_by_id(resume_id: str, request: Request, user_id: int = Depends(get_current_user)):
     user_id = user_id["id"]
     res = int(resume_id)
-    conn = sqlite3.connect("results.db")
+    conn = get_connection()
     c = conn.cursor()
+    c.execute("SELECT row_version FROM results WHERE id = ? AND user_id = ?", (res, user_id))
+    version_row = c.fetchone()
+    if version_row:
+        etag = make_etag("resume", res, version_row[0])
+        if etag_matches(request, etag):
+            conn.close()
+            return not_modified(etag, PRIVATE_REVALIDATE)
     c.execute(
-        "CREATE TABLE IF NOT EXISTS results (id INTEGER PRIMARY KEY AUTOINCREMENT,company TEXT,date TEXT,role TEXT,status INTEGER,atsScore INTEGER,content TEXT, profile_id INTEGER, user_id INTEGER)"
-    )
-    c.execute(
-        "SELECT id, company, date, role, status, atsScore, content, profile_id FROM results WHERE id = ? AND user_id = ?",
+        "SELECT id, company, date, role, status, atsScore, content, profile_id, originalScore, score_status FROM results WHERE id = ? AND user_id = ?",
         (res, user_id),
     )
     row = c.fetchone()
     conn.close()
     if row:
-        return {
+        return JSONResponse(content={
             "id": row[0],
             "companyName": row[1],
             "date": row[2],
@@ -609,26 +946,76 @@ def get_resume_by_id(resume_id: str, user_id: int = Depends(get_current_user)):
             "status": "generated" if row[4] == 0 else "optimized",
             "atsScore": row[5],
             "content": row[6],
-            "profile_id": row[7]
-        }
+            "profile_id": row[7],
+            "originalScore": row[8],
+            "scoreStatus": row[9] or "done"
+        }, headers={"ETag": etag, "Cache-Control": PRIVATE_REVALIDATE})
     else:
         return {"error": "Resume not found"}
 
-@app.get("/pdf/{resume_id}")
-def generate_pdf_api(resume_id: str, request: Request, user_id: int = Depends(get_current_user)):
-    user_id = user_id["id"]
-    # profile_id = request.query_params.get("profile_id")  # No longer needed
-    res = int(resume_id)
-    conn = sqlite3.connect("results.db")
+def owns_result(resume_id: int, user_id: int) -> bool:
+    conn = get_connection()
     c = conn.cursor()
-    c.execute(
-        "CREATE TABLE IF NOT EXISTS results (id INTEGER PRIMARY KEY AUTOINCREMENT,company TEXT,date TEXT,role TEXT,status INTEGER,atsScore INTEGER,content TEXT, profile_id INTEGER, user_id INTEGER)"
-    )
-    c.execute("SELECT content, profile_id FROM results WHERE id = ? AND user_id = ?", (res, user_id))
+    c.execute("SELECT 1 FROM results WHERE id = ? AND user_id = ?", (resume_id, user_id))
     row = c.fetchone()
-    if not row:
-        conn.close()
+    conn.close()
+    return row is not None
+
+@app.get("/resume/{resume_id}/versions")
+def list_resume_versions(resume_id: int, user_id: int = Depends(get_current_user)):
+    if not owns_result(resume_id, user_id["id"]):
         return JSONResponse(content={"error": "Resume not found"}, status_code=404)
+    return {"id": resume_id, "versions": versioning.list_versions(resume_id)}
+
+@app.get("/resume/{resume_id}/versions/{version}")
+def get_resume_version(resume_id: int, version: int, user_id: int = Depends(get_current_user)):
+    if not owns_result(resume_id, user_id["id"]):
+        return JSONResponse(content={"error": "Resume not found"}, status_code=404)
+    doc = versioning.get_version(resume_id, version)
+    if doc is None:
+        return JSONResponse(content={"error": "Version not found"}, status_code=404)
+    return {"id": resume_id, "version": version, "content": versioning.dump_content(doc)}
+
+@app.get("/resume/{resume_id}/diff")
+def diff_resume_versions(resume_id: int, from_version: int, to_version: int,
+                         user_id: int = Depends(get_current_user)):
+    """JSON patch from one version to another, so the client never needs both documents."""
+    if not owns_result(resume_id, user_id["id"]):
+        return JSONResponse(content={"error": "Resume not found"}, status_code=404)
+    patch = versioning.diff_versions(resume_id, from_version, to_version)
+    if patch is None:
+        return JSONResponse(content={"error": "Version not found"}, status_code=404)
+    return {"id": resume_id, "from_version": from_version, "to_version": to_version, "patch": patch}
+
+@app.post("/resume/{resume_id}/versions/{version}/restore")
+def restore_resume_version(resume_id: int, version: int, background_tasks: BackgroundTasks,
+                           user_id: int = Depends(get_current_user)):
+    """Roll back: the old content becomes the current content and a new version."""
+    if not owns_result(resume_id, user_id["id"]):
+        return JSONResponse(content={"error": "Resume not found"}, status_code=404)
+    doc = versioning.get_version(resume_id, version)
+    if doc is None:
+        return JSONResponse(content={"error": "Version not found"}, status_code=404)
+    content = versioning.dump_content(doc)
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("UPDATE results SET content = ?, row_version = row_version + 1 WHERE id = ?", (content, resume_id))
+    record_change(c, resume_id, "restored")
+    conn.commit()
+    conn.close()
+    new_version = versioning.record_version(resume_id, content, f"restored v{version}")
+    background_tasks.add_task(refresh_thumbnail, resume_id)
+    return {"id": resume_id, "version": new_version, "content": content}
+
+def load_resume_data(c, resume_id: int, user_id: int | None = None) -> dict | None:
+    """Assemble the template data for a result row: content + profile contact + education."""
+    if user_id is None:
+        c.execute("SELECT content, profile_id FROM results WHERE id = ?", (resume_id,))
+    else:
+        c.execute("SELECT content, profile_id FROM results WHERE id = ? AND user_id = ?", (resume_id, user_id))
+    row = c.fetchone()
+    if not row:
+        return None
     content, stored_profile_id = row
 
     # Always use stored_profile_id, default to 1 if missing
@@ -636,7 +1023,6 @@ def generate_pdf_api(resume_id: str, request: Request, user_id: int = Depends(ge
 
     c.execute("SELECT name, phone, email, github FROM user_profile WHERE id = ?", (profile_id,))
     profile_row = c.fetchone()
-    conn.close()
 
     extra = {}
     if profile_row:
@@ -674,33 +1060,303 @@ def generate_pdf_api(resume_id: str, request: Request, user_id: int = Depends(ge
     },\
     
     ]
-    pdf_path = f"resume_{resume_id}.pdf"
-    generate_pdf_from_content(resume_data, pdf_path)
-    return FileResponse(pdf_path, media_type="application/pdf", filename=pdf_path)
+    return resume_data
+
+@app.get("/pdf/{resume_id}")
+def generate_pdf_api(resume_id: str, request: Request, user_id: int = Depends(get_current_user)):
+    user_id = user_id["id"]
+    # profile_id = request.query_params.get("profile_id")  # No longer needed
+    res = int(resume_id)
+    conn = get_connection()
+    c = conn.cursor()
+    resume_data = load_resume_data(c, res, user_id)
+    conn.close()
+    if resume_data is None:
+        return JSONResponse(content={"error": "Resume not found"}, status_code=404)
+    # Keyed on what gets rendered, not on row_version: writing a score or an
+    # unrelated profile field bumps the row but leaves the PDF unchanged.
+    render_key = "%s-%s" % (pdf_utils.content_hash(resume_data), pdf_utils.template_hash())
+    etag = make_etag("pdf", render_key)
+    if etag_matches(request, etag):
+        return not_modified(etag, PRIVATE_REVALIDATE)
+
+    pdf_path = os.path.join(pdf_utils.PDF_CACHE_DIR, f"{render_key}.pdf")
+    if not pdf_utils.cache_hit(pdf_path):
+        pdf_utils.render_pdf_to_cache(resume_data, pdf_path)
+    # FileResponse answers Range / If-Range requests from the cached file.
+    return FileResponse(pdf_path, media_type="application/pdf", filename=f"resume_{resume_id}.pdf",
+                        headers={"ETag": etag, "Cache-Control": PRIVATE_REVALIDATE})
+
+_thumbnails_queued: set[int] = set()
+_thumbnails_queued_lock = threading.Lock()
+
+
+def queue_thumbnail(background_tasks: BackgroundTasks, resume_id: int):
+    """Queue refresh_thumbnail unless this worker already has one queued for the row."""
+    with _thumbnails_queued_lock:
+        if resume_id in _thumbnails_queued:
+            return
+        _thumbnails_queued.add(resume_id)
+    background_tasks.add_task(refresh_thumbnail, resume_id)
+
+
+def refresh_thumbnail(resume_id: int):
+    """Background task: render the preview for the row's current content if not cached yet."""
+    try:
+        conn = get_connection()
+        c = conn.cursor()
+        resume_data = load_resume_data(c, resume_id)
+        conn.close()
+        if resume_data is None:
+            return
+        pdf_utils.get_thumbnail(resume_data)
+    except Exception:
+        logger.exception("thumbnail render failed for resume %s", resume_id)
+    finally:
+        with _thumbnails_queued_lock:
+            _thumbnails_queued.discard(resume_id)
+
+@app.get("/thumbnail/{resume_id}")
+def get_thumbnail_api(resume_id: int, user_id: int = Depends(get_current_user)):
+    user_id = user_id["id"]
+    conn = get_connection()
+    c = conn.cursor()
+    resume_data = load_resume_data(c, resume_id, user_id)
+    conn.close()
+    if resume_data is None:
+        return JSONResponse(content={"error": "Resume not found"}, status_code=404)
+    png = pdf_utils.get_thumbnail(resume_data)
+    return Response(content=png, media_type="image/png")
+
+@app.get("/thumbnails")
+def get_thumbnails_api(ids: str, background_tasks: BackgroundTasks, user_id: int = Depends(get_current_user)):
+    """Batch preview fetch for the dashboard: ?ids=1,2,3 -> {id: data URI}.
+
+    Only previews already cached are returned; missing ones are rendered in
+    the background and listed under "pending" for the client to ask again.
+    """
+    user_id = user_id["id"]
+    try:
+        resume_ids = [int(i) for i in ids.split(",") if i.strip()][:MAX_THUMBNAIL_BATCH]
+    except ValueError:
+        return JSONResponse(content={"error": "ids must be a comma-separated list of integers"}, status_code=400)
+    conn = get_connection()
+    c = conn.cursor()
+    datas = {rid: load_resume_data(c, rid, user_id) for rid in resume_ids}
+    conn.close()
+    thumbnails, pending = {}, []
+    for rid, resume_data in datas.items():
+        if resume_data is None:
+            continue
+        png = pdf_utils.cached_thumbnail(resume_data)
+        if png is None:
+            pending.append(rid)
+            queue_thumbnail(background_tasks, rid)
+            continue
+        thumbnails[rid] = "data:image/png;base64," + base64.b64encode(png).decode("ascii")
+    return {"thumbnails": thumbnails, "pending": pending}
+
+def estimate_tokens(text: str) -> int:
+    # Gemini averages roughly four characters per token for English prose.
+    return (len(text) + 3) // 4
+
+
+def dedupe(items):
+    seen = set()
+    out = []
+    for item in items:
+        key = " ".join(item.lower().split())
+        if key and key not in seen:
+            seen.add(key)
+            out.append(item.strip())
+    return out
+
+
+def render_compact(resume: Resume) -> str:
+    """Terse plain-text rendering of a structured résumé for prompts.
+
+    Skills repeated across categories and bullets repeated across roles are
+    sent once; empty fields and JSON punctuation are left out.
+    """
+    lines = [f"Name: {resume.name}", f"Summary: {resume.profile.summary.strip()}"]
+    seen_skills = set()
+    for category, skills in resume.profile.skills.items():
+        unique = [s for s in dedupe(skills) if s.lower() not in seen_skills]
+        seen_skills.update(s.lower() for s in unique)
+        if unique:
+            lines.append(f"Skills/{category}: {', '.join(unique)}")
+    if resume.profile.core_competencies:
+        lines.append(f"Competencies: {'; '.join(dedupe(resume.profile.core_competencies))}")
+
+    seen_bullets = set()
+    for job in resume.experience:
+        header = " | ".join(x for x in [job.title, job.company, job.location,
+                                         f"{job.start_date}-{job.end_date or 'Present'}"] if x)
+        lines.append(f"## {header}")
+        if job.summary:
+            lines.append(job.summary.strip())
+        for bullet in dedupe(job.responsibilities):
+            if bullet.lower() not in seen_bullets:
+                seen_bullets.add(bullet.lower())
+                lines.append(f"- {bullet}")
+    for project in resume.projects:
+        lines.append(f"## Project: {project.name} | {project.technologies} | {project.date}")
+        lines.extend(f"- {d}" for d in dedupe(project.description))
+    return "\n".join(lines)
+
+
+def source_texts(resumes: list[str]) -> list[str]:
+    return [r for r in resumes if r and r.strip()]
+
+
+def source_hash(resumes: list[str]) -> str:
+    """Hash of the résumé texts a master was parsed from."""
+    return hashlib.sha256(json.dumps(source_texts(resumes)).encode("utf-8")).hexdigest()
+
+
+def latest_master_version(c, profile_id: int) -> int | None:
+    c.execute("SELECT MAX(version) FROM profile_master WHERE profile_id = ?", (profile_id,))
+    return c.fetchone()[0]
+
+
+def current_master_version(c, profile_id: int, resumes: list[str]) -> int | None:
+    """Latest master version, but only if it was parsed from `resumes` as they are now.
+
+    Right after a profile edit (or when the re-parse failed) the newest master
+    describes old text, and the caller has to fall back to the raw résumés.
+    """
+    c.execute("SELECT version, source_hash FROM profile_master WHERE profile_id = ? ORDER BY version DESC LIMIT 1",
+              (profile_id,))
+    row = c.fetchone()
+    if row is None or row[1] != source_hash(resumes):
+        return None
+    return row[0]
+
+
+def load_master(c, profile_id: int, version: int) -> tuple[Resume, str]:
+    """(structured résumé, compact rendering) for one immutable master version."""
+    c.execute("SELECT resume FROM profile_master WHERE profile_id = ? AND version = ?", (profile_id, version))
+    return _parse_master(c.fetchone()[0])
+
+
+@lru_cache(maxsize=256)
+def _parse_master(resume_json: str) -> tuple[Resume, str]:
+    # Keyed on the stored JSON itself: profile ids and master versions are
+    # reused once a profile is deleted, so they can't identify a parse.
+    resume = Resume.model_validate_json(resume_json)
+    return resume, render_compact(resume)
+
+
+def refresh_master_resume(profile_id: int, resumes: list[str]):
+    """Background task: re-parse the profile's résumés into a new master version if they changed."""
+    resumes = source_texts(resumes)
+    if not resumes:
+        return
+    conn = get_connection()
+    c = conn.cursor()
+    current = current_master_version(c, profile_id, resumes)
+    conn.close()
+    if current is not None:
+        return
+    try:
+        resume = parse_resume(resumes)
+    except Exception:
+        logger.exception("parsing master resume for profile %s failed", profile_id)
+        return
+    parse_tokens = estimate_tokens("".join(resumes)) + estimate_tokens(resume.model_dump_json())
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    # Two quick saves race: if the profile changed while we were parsing, a
+    # newer parse is (or will be) running, and ours must not become the latest.
+    c.execute("SELECT resumes FROM user_profile WHERE id = ?", (profile_id,))
+    row = c.fetchone()
+    if row is None or source_hash(json.loads(row[0] or "[]")) != source_hash(resumes):
+        conn.rollback()
+        conn.close()
+        return
+    c.execute(
+        "INSERT INTO profile_master (profile_id, version, source_hash, resume, parse_tokens, created_at) "
+        "VALUES (?, COALESCE((SELECT MAX(version) FROM profile_master WHERE profile_id = ?), 0) + 1, ?, ?, ?, ?)",
+        (profile_id, profile_id, source_hash(resumes), resume.model_dump_json(), parse_tokens, datetime.now().isoformat()),
+    )
+    conn.commit()
+    conn.close()
+
+
+def resolve_resume_text(profile_id: int | None, user_id: int, current_resume: str) -> tuple[str, dict]:
+    """Pick the résumé text to put in the prompt.
+
+    When the caller sent one of the profile's stored résumés (or nothing) and a
+    master parsed from the profile's current résumés exists, the compact master
+    rendering replaces the raw text. A résumé pasted ad hoc is always sent
+    as-is; with nothing sent and no up-to-date master, the stored résumés are.
+    """
+    stats = {"resume_tokens_raw": estimate_tokens(current_resume), "master_version": None}
+    if profile_id is None:
+        stats["resume_tokens_sent"] = stats["resume_tokens_raw"]
+        return current_resume, stats
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT resumes FROM user_profile WHERE id = ? AND user_id = ?", (profile_id, user_id))
+    row = c.fetchone()
+    resumes = json.loads(row[0] or "[]") if row else []
+    version = current_master_version(c, profile_id, resumes) if row else None
+    stored = {r.strip() for r in resumes if r}
+    if version is None or (current_resume.strip() and current_resume.strip() not in stored):
+        conn.close()
+        raw = current_resume if current_resume.strip() else "\n\n".join(source_texts(resumes))
+        stats.update(resume_tokens_raw=estimate_tokens(raw), resume_tokens_sent=estimate_tokens(raw))
+        return raw, stats
+    _, compact = load_master(c, profile_id, version)
+    conn.close()
+    stats.update(master_version=version, resume_tokens_sent=estimate_tokens(compact))
+    return compact, stats
+
+
+@app.get("/profiles/{profile_id}/master")
+def get_master_resume(profile_id: int, user_id: int = Depends(get_current_user)):
+    user_id = user_id["id"]
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT id FROM user_profile WHERE id = ? AND user_id = ?", (profile_id, user_id))
+    owned = c.fetchone()
+    version = latest_master_version(c, profile_id) if owned else None
+    if version is None:
+        conn.close()
+        return JSONResponse(content={"error": "No parsed resume for this profile yet"}, status_code=404)
+    c.execute("SELECT parse_tokens, created_at FROM profile_master WHERE profile_id = ? AND version = ?",
+              (profile_id, version))
+    parse_tokens, created_at = c.fetchone()
+    resume, compact = load_master(c, profile_id, version)
+    conn.close()
+    return {
+        "profile_id": profile_id,
+        "version": version,
+        "created_at": created_at,
+        "resume": resume.model_dump(),
+        "parse_tokens": parse_tokens,
+        "compact_tokens": estimate_tokens(compact),
+    }
 
 @app.get("/profiles")
-def list_profiles(user_id: int = Depends(get_current_user)):
+def list_profiles(request: Request, user_id: int = Depends(get_current_user)):
     user_id = user_id["id"]
-    conn = sqlite3.connect("results.db")
+    conn = get_connection()
     c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS user_profile (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            phone TEXT,
-            email TEXT,
-            github TEXT,
-            resumes TEXT,
-            user_id INTEGER
-        )
-    """)
     c.execute(
-        "SELECT id, name, phone, email, github, resumes FROM user_profile WHERE user_id = ?",
+        "SELECT id, name, phone, email, github, resumes FROM user_profile WHERE user_id = ? ORDER BY id",
         (user_id,),
     )
     rows = c.fetchall()
     conn.close()
-    return [
+    # Hash the rows themselves: profile ids (POST /profile always writes id 1)
+    # and row_version both restart after a delete, so they can't tell old
+    # content from new.
+    etag = make_etag("profiles", user_id, rows)
+    if etag_matches(request, etag):
+        return not_modified(etag, PRIVATE_REVALIDATE)
+    return JSONResponse(content=[
         {
             "id": row[0],
             "name": row[1],
@@ -710,49 +1366,44 @@ def list_profiles(user_id: int = Depends(get_current_user)):
             "resumes": json.loads(row[5]) if row[5] else []
         }
         for row in rows
-    ]
+    ], headers={"ETag": etag, "Cache-Control": PRIVATE_REVALIDATE})
 
 @app.post("/profiles")
-def create_profile(profile: UserProfile, user_id: int = Depends(get_current_user)):
+def create_profile(profile: UserProfile, background_tasks: BackgroundTasks, user_id: int = Depends(get_current_user)):
     user_id = user_id["id"]
-    conn = sqlite3.connect("results.db")
+    conn = get_connection()
     c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS user_profile (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            phone TEXT,
-            email TEXT,
-            github TEXT,
-            resumes TEXT,
-            user_id INTEGER
-        )
-    """)
     c.execute("INSERT INTO user_profile (name, phone, email, github, resumes, user_id) VALUES (?, ?, ?, ?, ?, ?)",
               (profile.name, profile.phone, profile.email, profile.github, json.dumps(profile.resumes), user_id))
     conn.commit()
     new_id = c.lastrowid
     conn.close()
+    background_tasks.add_task(refresh_master_resume, new_id, profile.resumes)
     return {"id": new_id, "message": "Profile created"}
 
 @app.put("/profiles/{profile_id}")
-def update_profile(profile_id: int, profile: UserProfile, user_id: int = Depends(get_current_user)):
+def update_profile(profile_id: int, profile: UserProfile, background_tasks: BackgroundTasks, user_id: int = Depends(get_current_user)):
     user_id = user_id["id"]
-    conn = sqlite3.connect("results.db")
+    conn = get_connection()
     c = conn.cursor()
-    c.execute("UPDATE user_profile SET name=?, phone=?, email=?, github=?, resumes=? WHERE id=? AND user_id=?",
+    c.execute("UPDATE user_profile SET name=?, phone=?, email=?, github=?, resumes=?, row_version=row_version+1 WHERE id=? AND user_id=?",
               (profile.name, profile.phone, profile.email, profile.github, json.dumps(profile.resumes), profile_id, user_id))
+    updated = c.rowcount
     conn.commit()
     conn.close()
+    if updated:
+        background_tasks.add_task(refresh_master_resume, profile_id, profile.resumes)
     return {"message": "Profile updated"}
 
 @app.delete("/profiles/{profile_id}")
 def delete_profile(profile_id: int, user_id: int = Depends(get_current_user)):
     user_id = user_id["id"]
-    conn = sqlite3.connect("results.db")
+    conn = get_connection()
     c = conn.cursor()
     c.execute("DELETE FROM user_profile WHERE id=? AND user_id=?", (profile_id, user_id))
     deleted = c.rowcount  
+    if deleted:
+        c.execute("DELETE FROM profile_master WHERE profile_id=?", (profile_id,))
     conn.commit()
     conn.close()
     if deleted == 0:
@@ -762,7 +1413,7 @@ def delete_profile(profile_id: int, user_id: int = Depends(get_current_user)):
 @app.get("/profiles/{profile_id}")
 def get_profile(profile_id: int, user_id: int = Depends(get_current_user)):
     user_id = user_id["id"]
-    conn = sqlite3.connect("results.db")
+    conn = get_connection()
     c = conn.cursor()
     c.execute("SELECT id, name, phone, email, github, resumes FROM user_profile WHERE id=? AND user_id=?", (profile_id, user_id))
     row = c.fetchone()
@@ -780,32 +1431,23 @@ def get_profile(profile_id: int, user_id: int = Depends(get_current_user)):
         return {"error": "Profile not found"}
         
 @app.post("/profile")
-def save_profile(profile: UserProfile, user_id: int = Depends(get_current_user)):
+def save_profile(profile: UserProfile, background_tasks: BackgroundTasks, user_id: int = Depends(get_current_user)):
     user_id = user_id["id"]
-    conn = sqlite3.connect("results.db")
+    conn = get_connection()
     c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS user_profile (
-            id INTEGER PRIMARY KEY,
-            name TEXT,
-            phone TEXT,
-            email TEXT,
-            github TEXT,
-            resumes TEXT,
-            user_id INTEGER
-        )
-    """)
     c.execute("SELECT id FROM user_profile WHERE id = 1 AND user_id = ?", (user_id,))
     exists = c.fetchone()
     if exists:
-         c.execute("UPDATE user_profile SET name=?, phone=?, email=?, github=?, resumes=? WHERE id=1 AND user_id=?",
+         c.execute("UPDATE user_profile SET name=?, phone=?, email=?, github=?, resumes=?, row_version=row_version+1 WHERE id=1 AND user_id=?",
                   (profile.name, profile.phone, profile.email, profile.github, json.dumps(profile.resumes), user_id))
     else:
         c.execute("INSERT INTO user_profile (id, name, phone, email, github, resumes, user_id) VALUES (1,?,?,?,?,?,?)",
                   (profile.name, profile.phone, profile.email, profile.github, json.dumps(profile.resumes), user_id))
     conn.commit()
     conn.close()
+    background_tasks.add_task(refresh_master_resume, 1, profile.resumes)
     return {"message": "Profile saved"}
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("res:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
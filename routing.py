@@ -0,0 +1,140 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import llm_utils
+
+logger = logging.getLogger(__name__)
+
+# Model tiers, cheapest first. Prices are USD per million tokens (input,
+# output incl. thinking) and only feed the cost estimates in tier_stats.
+TIERS = {
+    "lite": {
+        "model": os.getenv("LLM_TIER_LITE_MODEL", "gemini-2.5-flash-lite"),
+        "thinking_budget": int(os.getenv("LLM_TIER_LITE_THINKING", "0")),
+        "price_in": 0.10, "price_out": 0.40,
+    },
+    "standard": {
+        # LLM_MODEL was the single model setting before tiers; it still picks the standard one.
+        "model": os.getenv("LLM_TIER_STANDARD_MODEL", os.getenv("LLM_MODEL", "gemini-2.5-flash")),
+        "thinking_budget": int(os.getenv("LLM_TIER_STANDARD_THINKING", "-1")),
+        "price_in": 0.30, "price_out": 2.50,
+    },
+    "pro": {
+        "model": os.getenv("LLM_TIER_PRO_MODEL", "gemini-2.5-pro"),
+        "thinking_budget": int(os.getenv("LLM_TIER_PRO_THINKING", "-1")),
+        "price_in": 1.25, "price_out": 10.00,
+    },
+}
+TIER_ORDER = ["lite", "standard", "pro"]
+MAX_TIER   = os.getenv("LLM_MAX_TIER", "standard")   # escalation never goes above this
+
+# Default tier per call type; override with LLM_ROUTE_<CALL_TYPE>=<tier>.
+DEFAULT_ROUTES = {
+    "generate_resume": "standard",
+    "rewrite_resume": "standard",             # first optimize round
+    "rewrite_resume_followup": "lite",        # later rounds only address ATS feedback
+    "evaluate_resume": "lite",
+    "parse_resume": "lite",
+}
+
+# Set by the regression runner to compare routings.
+route_overrides: dict[str, str] = {}
+
+
+def route(call_type: str) -> str:
+    if call_type in route_overrides:
+        return route_overrides[call_type]
+    return os.getenv(f"LLM_ROUTE_{call_type.upper()}", DEFAULT_ROUTES.get(call_type, "standard"))
+
+
+def escalation_path(tier: str) -> list[str]:
+    start = TIER_ORDER.index(tier)
+    stop = max(TIER_ORDER.index(MAX_TIER), start)
+    return TIER_ORDER[start:stop + 1]
+
+
+def model_for(call_name: str, tier: str) -> str:
+    # A per-call override (regression runner) wins over the tier's model.
+    return llm_utils.model_overrides.get(call_name) or TIERS[tier]["model"]
+
+
+def thinking_budget(tier: str) -> int:
+    return TIERS[tier]["thinking_budget"]
+
+
+class TierStats:
+    """Per-tier call counts, latency, estimated cost and escalation rate."""
+
+    def __init__(self, window: int = 500):
+        self.lock = threading.Lock()
+        self.window = window
+        self.tiers: dict[str, dict] = {}
+
+    def record(self, tier: str, call_type: str, seconds: float, usage: dict | None, escalated: bool):
+        usage = usage or {}
+        tokens_in = usage.get("prompt_token_count") or 0
+        tokens_out = (usage.get("candidates_token_count") or 0) + (usage.get("thoughts_token_count") or 0)
+        price = TIERS[tier]
+        cost = (tokens_in * price["price_in"] + tokens_out * price["price_out"]) / 1e6
+        with self.lock:
+            entry = self.tiers.setdefault(tier, {
+                "calls": 0, "escalations": 0, "tokens_in": 0, "tokens_out": 0, "cost_usd": 0.0,
+                "latencies": deque(maxlen=self.window), "by_call_type": {},
+            })
+            entry["calls"] += 1
+            entry["escalations"] += int(escalated)
+            entry["tokens_in"] += tokens_in
+            entry["tokens_out"] += tokens_out
+            entry["cost_usd"] += cost
+            entry["latencies"].append(seconds)
+            per_type = entry["by_call_type"].setdefault(call_type, {"calls": 0, "escalations": 0})
+            per_type["calls"] += 1
+            per_type["escalations"] += int(escalated)
+
+    def reset(self):
+        with self.lock:
+            self.tiers.clear()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            out = {}
+            for tier, entry in self.tiers.items():
+                latencies = sorted(entry["latencies"])
+                out[tier] = {
+                    "model": TIERS[tier]["model"],
+                    "calls": entry["calls"],
+                    "escalations": entry["escalations"],
+                    "escalation_rate": round(entry["escalations"] / entry["calls"], 3),
+                    "p50_seconds": round(latencies[int(0.50 * (len(latencies) - 1))], 3),
+                    "p95_seconds": round(latencies[int(0.95 * (len(latencies) - 1))], 3),
+                    "tokens_in": entry["tokens_in"],
+                    "tokens_out": entry["tokens_out"],
+                    "cost_usd": round(entry["cost_usd"], 6),
+                    "by_call_type": {k: dict(v) for k, v in entry["by_call_type"].items()},
+                }
+            return out
+
+
+tier_stats = TierStats()
+
+
+def run_tiered(call_type: str, attempt, check):
+    """Run attempt(tier) on the routed tier, escalating while check(result) objects.
+
+    check returns None to accept a result, or a short reason to try the next
+    tier up. The top allowed tier's result is always accepted. Exceptions
+    from attempt (deadline, API errors) propagate; they are not escalations.
+    """
+    tiers = escalation_path(route(call_type))
+    for i, tier in enumerate(tiers):
+        started = time.monotonic()
+        result = attempt(tier)
+        reason = check(result)
+        escalate = reason is not None and i < len(tiers) - 1
+        tier_stats.record(tier, call_type, time.monotonic() - started, llm_utils.last_usage(), escalate)
+        if not escalate:
+            return result
+        logger.info("escalating %s from %s to %s: %s", call_type, tier, tiers[i + 1], reason)
@@ -0,0 +1,42 @@
+# Production entry point: migrate the schema once, then pre-fork workers.
+#
+#   python serve.py                 # one worker per core
+#   python serve.py --workers 4
+#
+# For local development keep using `python res.py` (single process, reload).
+
+import argparse
+import os
+
+import uvicorn
+
+from db import fail_stale_scores, init_db
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the CVSync API with multiple workers.")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+                        help="seconds to let in-flight requests finish on shutdown "
+                             "(after the DRAIN_SECONDS period in which /readyz reports draining)")
+    args = parser.parse_args()
+
+    init_db()
+    # No worker is running yet, so every pending score belongs to a dead process.
+    fail_stale_scores()
+    # Workers inherit this and skip the startup migration.
+    os.environ["CVSYNC_SCHEMA_READY"] = "1"
+
+    uvicorn.run(
+        "res:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+
+
+if __name__ == "__main__":
+    main()
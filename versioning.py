@@ -0,0 +1,232 @@
+import copy
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from db import get_connection
+
+SNAPSHOT_EVERY = 8          # store a full copy at least every N versions
+CACHE_SIZE     = 512        # reconstructed versions kept in memory
+
+# Version history for `results.content`.
+#
+# Every version is a row in result_versions. A "snapshot" row holds the whole
+# document; a "delta" row holds a JSON patch (RFC 6902 add/remove/replace)
+# from the previous version. Reading version N starts at the nearest snapshot
+# (or cached version) at or below N and applies the deltas after it.
+
+
+def _escape(key) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def diff(old, new, path: str = "") -> list[dict]:
+    """JSON patch turning `old` into `new`, recursing into objects and lists."""
+    if type(old) is not type(new):
+        return [{"op": "replace", "path": path, "value": new}]
+    if isinstance(old, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": f"{path}/{_escape(key)}", "value": value})
+            else:
+                ops.extend(diff(old[key], value, f"{path}/{_escape(key)}"))
+        return ops
+    if isinstance(old, list):
+        ops = []
+        for i in range(min(len(old), len(new))):
+            ops.extend(diff(old[i], new[i], f"{path}/{i}"))
+        for i in range(len(old), len(new)):
+            ops.append({"op": "add", "path": f"{path}/{i}", "value": new[i]})
+        # Remove from the end so earlier indices stay valid.
+        for i in range(len(old) - 1, len(new) - 1, -1):
+            ops.append({"op": "remove", "path": f"{path}/{i}"})
+        return ops
+    if old != new:
+        return [{"op": "replace", "path": path, "value": new}]
+    return []
+
+
+def apply_patch(doc, patch: list[dict]):
+    """Return a new document with `patch` applied; `doc` is not modified."""
+    doc = copy.deepcopy(doc)
+    for op in patch:
+        if op["path"] == "":
+            doc = copy.deepcopy(op.get("value"))
+            continue
+        *parents, last = [_unescape(t) for t in op["path"].split("/")[1:]]
+        target = doc
+        for token in parents:
+            target = target[int(token)] if isinstance(target, list) else target[token]
+        if isinstance(target, list):
+            index = int(last)
+            if op["op"] == "add":
+                target.insert(index, copy.deepcopy(op["value"]))
+            elif op["op"] == "remove":
+                del target[index]
+            else:
+                target[index] = copy.deepcopy(op["value"])
+        else:
+            if op["op"] == "remove":
+                del target[last]
+            else:
+                target[last] = copy.deepcopy(op["value"])
+    return doc
+
+
+def parse_content(content: str | None):
+    """Structured JSON when the content is JSON, otherwise the raw string."""
+    if content is None:
+        return None
+    try:
+        return json.loads(content)
+    except (TypeError, ValueError):
+        return content
+
+
+def dump_content(doc) -> str | None:
+    if doc is None or isinstance(doc, str):
+        return doc
+    return json.dumps(doc, ensure_ascii=False)
+
+
+class _VersionCache:
+    """LRU of reconstructed documents. Versions are immutable, so entries never go stale."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key, doc):
+        with self.lock:
+            self.items[key] = doc
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+
+_cache = _VersionCache(CACHE_SIZE)
+_MISSING = object()
+
+
+def _reconstruct(c, result_id: int, version: int):
+    cached = _cache.get((result_id, version))
+    if cached is not None:
+        return copy.deepcopy(cached)
+
+    c.execute(
+        "SELECT MAX(version) FROM result_versions WHERE result_id = ? AND version <= ? AND kind = 'snapshot'",
+        (result_id, version),
+    )
+    snapshot = c.fetchone()[0]
+    if snapshot is None:
+        return _MISSING
+
+    # Start from the newest cached version between the snapshot and the target, if any.
+    base_version, doc = snapshot, _MISSING
+    for v in range(version - 1, snapshot - 1, -1):
+        cached = _cache.get((result_id, v))
+        if cached is not None:
+            base_version, doc = v, copy.deepcopy(cached)
+            break
+
+    c.execute(
+        "SELECT version, kind, payload FROM result_versions WHERE result_id = ? AND version BETWEEN ? AND ? ORDER BY version",
+        (result_id, base_version if doc is _MISSING else base_version + 1, version),
+    )
+    rows = c.fetchall()
+    if not rows or rows[-1][0] != version:
+        return _MISSING
+    for v, kind, payload in rows:
+        doc = json.loads(payload) if kind == "snapshot" else apply_patch(doc, json.loads(payload))
+    _cache.put((result_id, version), copy.deepcopy(doc))
+    return doc
+
+
+def get_version(result_id: int, version: int):
+    """Reconstructed document for one version (parsed JSON or raw string), or None."""
+    conn = get_connection()
+    try:
+        doc = _reconstruct(conn.cursor(), result_id, version)
+    finally:
+        conn.close()
+    return None if doc is _MISSING else doc
+
+
+def diff_versions(result_id: int, from_version: int, to_version: int) -> list[dict] | None:
+    conn = get_connection()
+    try:
+        c = conn.cursor()
+        old = _reconstruct(c, result_id, from_version)
+        new = _reconstruct(c, result_id, to_version)
+    finally:
+        conn.close()
+    if old is _MISSING or new is _MISSING:
+        return None
+    return diff(old, new)
+
+
+def list_versions(result_id: int) -> list[dict]:
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute(
+        "SELECT version, kind, source, ats_score, created_at FROM result_versions WHERE result_id = ? ORDER BY version",
+        (result_id,),
+    )
+    rows = c.fetchall()
+    conn.close()
+    return [
+        {"version": r[0], "kind": r[1], "source": r[2], "atsScore": r[3], "created_at": r[4]}
+        for r in rows
+    ]
+
+
+def record_version(result_id: int, content: str | None, source: str, ats_score: int | None = None) -> int:
+    """Append `content` as the next version of a result and return its number.
+
+    Stored as a delta from the previous version unless a snapshot is due, or
+    the delta would be larger than the document itself.
+    """
+    doc = parse_content(content)
+    conn = get_connection()
+    try:
+        c = conn.cursor()
+        # Serialize writers across worker processes so version numbers don't collide.
+        c.execute("BEGIN IMMEDIATE")
+        c.execute("SELECT MAX(version) FROM result_versions WHERE result_id = ?", (result_id,))
+        previous = c.fetchone()[0]
+        version = (previous or 0) + 1
+
+        kind, payload = "snapshot", json.dumps(doc, ensure_ascii=False)
+        if previous is not None and (version - 1) % SNAPSHOT_EVERY != 0:
+            old = _reconstruct(c, result_id, previous)
+            if old is not _MISSING:
+                delta = json.dumps(diff(old, doc), ensure_ascii=False)
+                if len(delta) < len(payload):
+                    kind, payload = "delta", delta
+
+        c.execute(
+            "INSERT INTO result_versions (result_id, version, kind, payload, source, ats_score, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (result_id, version, kind, payload, source, ats_score, datetime.now().isoformat()),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    _cache.put((result_id, version), copy.deepcopy(doc))
+    return version